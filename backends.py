@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Text Extraction Backends
+===========================================
+Extract raw text from PDF files
+ * tika: Apache Tika server (tika-python, or pooled client for configured servers)
+ * local: in-process pypdf engine (no JVM/server needed)
+Each backend records the extraction time and character count of every file.
+"""
+
+import os
+import abc
+import time
+import queue
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import lxml.etree as et
+from events import events
+
+
+# ----------------------------------------
+# Raised when text of PDF file cannot be requested (see TikaClient)
+class ExtractionError(Exception):
+    pass
+
+
+class Backend(abc.ABC):
+
+    name = None
+
+    def __init__(self):
+        # extraction statistics: (file, seconds, characters)
+        self.stats = []
+
+    # ----------------------------------------
+    # backend version (part of the extraction version of cached text)
+    @abc.abstractmethod
+    def version(self):
+        pass
+
+    # ----------------------------------------
+    # extract text and metadata of PDF file
+    # - returns {"metadata": dict, "content": text}
+    def extract(self, file):
+        start = time.perf_counter()
+        raw = self._extract(file)
+        self._record(file, start, raw["content"])
+        return raw
+
+    # ----------------------------------------
+    # extract text of selected pages of PDF file
+    # - first 'head' and last 'tail' pages are kept (tail: None keeps all pages)
+    # - other pages are left empty, so page numbers are unchanged
+    # - returns {"metadata": dict, "pages": list of page texts}
+    def extract_pages(self, file, head, tail):
+        start = time.perf_counter()
+        raw = self._extract_pages(file, head, tail)
+        self._record(file, start, ''.join(raw["pages"]))
+        return raw
+
+    # ----------------------------------------
+    # request text of PDF files ahead of extraction (if supported)
+    # - pages: page-delimited text requested
+    def prefetch(self, files, pages=False):
+        pass
+
+    @abc.abstractmethod
+    def _extract(self, file):
+        pass
+
+    @abc.abstractmethod
+    def _extract_pages(self, file, head, tail):
+        pass
+
+    # ----------------------------------------
+    # check if page is selected (see extract_pages())
+    @staticmethod
+    def is_selected(k, n_pages, head, tail):
+        return k < head or tail is None or k >= n_pages - tail
+
+    # ----------------------------------------
+    # record extraction statistics
+    def _record(self, file, start, content):
+        seconds = time.perf_counter() - start
+        self.stats.append((file, seconds, len(content or '')))
+        events.log("Extracted {} with {}: {} characters in {:.2f}s".format(file, self.name, len(content or ''), seconds))
+        events.emit('extracted', file=file, backend=self.name, seconds=round(seconds, 3), characters=len(content or ''))
+
+    # ----------------------------------------
+    # summary of extraction statistics: files, seconds, characters
+    def summary(self):
+        return len(self.stats), sum(s[1] for s in self.stats), sum(s[2] for s in self.stats)
+
+
+class TikaClient:
+
+    def __init__(self, servers, connections, retries, timeout):
+        import requests
+        self.requests = requests
+        self.retries = retries
+        self.timeout = timeout
+        # persistent sessions (one connection each), interleaved by server
+        self.sessions = queue.Queue()
+        for _ in range(connections):
+            for server in servers:
+                self.sessions.put((server.rstrip('/'), requests.Session()))
+        n_sessions = self.sessions.qsize()
+        self.executor = ThreadPoolExecutor(max_workers=n_sessions)
+        # prefetched requests: (file, xhtml) -> future; files to prefetch in order
+        self.window = 2 * n_sessions
+        self.pending = {}
+        self.queue = []
+        self.lock = threading.Lock()
+
+    # ----------------------------------------
+    # get text of PDF file from Tika text endpoint (None if Tika cannot parse file)
+    # - xhtml: page-delimited XHTML requested instead of plain text
+    # - failed requests (e.g. server restarting) are retried on the next connection
+    # - raises ExtractionError if all attempts fail
+    def get_text(self, file, xhtml=False):
+        headers = {
+            'Accept': 'text/html' if xhtml else 'text/plain',
+            'Content-Disposition': 'attachment; filename="{}"'.format(os.path.basename(file))}
+        for attempt in range(self.retries + 1):
+            server, session = self.sessions.get()
+            try:
+                with open(file, 'rb') as fp:
+                    response = session.put(server + '/tika', data=fp, headers=headers, timeout=self.timeout)
+                if response.status_code < 500:
+                    if response.status_code != 200:
+                        print("Error: Tika could not parse {} (status {}).".format(file, response.status_code))
+                        return None
+                    response.encoding = 'utf-8'
+                    return response.text
+                error = "status {}".format(response.status_code)
+            except self.requests.RequestException as e:
+                error = e
+            finally:
+                self.sessions.put((server, session))
+            if attempt < self.retries:
+                print("Tika request for {} failed ({}); retrying ...".format(file, error))
+                time.sleep(min(2 ** attempt, 30))
+        # (raised from the calling thread of get(), see prefetch())
+        raise ExtractionError("Tika request for {} failed after {} attempts ({}).".format(
+            file, self.retries + 1, error))
+
+    # ----------------------------------------
+    # request text of PDF files concurrently (limited number ahead of get())
+    def prefetch(self, files, xhtml=False):
+        with self.lock:
+            self.queue = [(file, xhtml) for file in files]
+            self._fill()
+
+    # ----------------------------------------
+    # get prefetched text of PDF file (requested now if not prefetched)
+    def get(self, file, xhtml=False):
+        with self.lock:
+            future = self.pending.pop((file, xhtml), None)
+            self._fill()
+        return future.result() if future is not None else self.get_text(file, xhtml)
+
+    def _fill(self):
+        while self.queue and len(self.pending) < self.window:
+            request = self.queue.pop(0)
+            if request not in self.pending:
+                self.pending[request] = self.executor.submit(self.get_text, *request)
+
+
+class TikaBackend(Backend):
+
+    name = 'tika'
+
+    def __init__(self, settings=None):
+        super().__init__()
+        from tika import parser
+        from tika.tika import TikaVersion
+        self.parser = parser
+        self.tika_version = TikaVersion
+        # pooled client for configured Tika servers (tika-python otherwise)
+        self.client = None
+        if settings and settings['servers']:
+            self.client = TikaClient(settings['servers'], settings['connections'], settings['retries'],
+                                     settings['timeout'])
+
+    def version(self):
+        return "tika-{}".format(self.tika_version)
+
+    def prefetch(self, files, pages=False):
+        if self.client:
+            self.client.prefetch(files, pages)
+
+    def _extract(self, file):
+        if self.client:
+            return {"metadata": {}, "content": self.client.get(file)}
+        raw = self.parser.from_file(file)
+        return {"metadata": raw["metadata"], "content": raw["content"]}
+
+    # ----------------------------------------
+    # pages are read from Tika XHTML output (Tika processes the full document)
+    # - parsing stops after the first pages if no last pages are kept
+    def _extract_pages(self, file, head, tail):
+        if self.client:
+            raw = {"metadata": {}, "content": self.client.get(file, True)}
+        else:
+            raw = self.parser.from_file(file, xmlContent=True)
+        pages = []
+        xhtml = BytesIO((raw["content"] or '').encode('utf-8'))
+        for event, node in et.iterparse(xhtml, tag='{*}div', recover=True):
+            if node.get('class') == 'page':
+                pages.append(''.join(node.itertext()))
+                node.clear()
+                if tail == 0 and len(pages) == head:
+                    break
+        pages = [page if self.is_selected(k, len(pages), head, tail) else '' for k, page in enumerate(pages)]
+        return {"metadata": raw["metadata"], "pages": pages}
+
+
+class LocalBackend(Backend):
+
+    name = 'local'
+
+    def __init__(self, settings=None):
+        super().__init__()
+        try:
+            import pypdf
+        except ImportError:
+            print("The local extraction backend requires pypdf (pip install pypdf).")
+            exit(1)
+        self.pypdf = pypdf
+
+    def version(self):
+        return "pypdf-{}".format(self.pypdf.__version__)
+
+    def _extract(self, file):
+        reader = self._read(file)
+        if reader is None:
+            return {"metadata": {}, "content": None}
+        content = '\n'.join(page.extract_text() for page in reader.pages)
+        return {"metadata": self._get_metadata(reader), "content": content}
+
+    # ----------------------------------------
+    # only selected pages are extracted
+    def _extract_pages(self, file, head, tail):
+        reader = self._read(file)
+        if reader is None:
+            return {"metadata": {}, "pages": []}
+        n_pages = len(reader.pages)
+        pages = [page.extract_text() if self.is_selected(k, n_pages, head, tail) else ''
+                 for k, page in enumerate(reader.pages)]
+        return {"metadata": self._get_metadata(reader), "pages": pages}
+
+    # ----------------------------------------
+    # open PDF file (None if file cannot be read, as Tika returns no content)
+    def _read(self, file):
+        try:
+            reader = self.pypdf.PdfReader(file)
+            len(reader.pages)
+            return reader
+        except (self.pypdf.errors.PdfReadError, OSError) as e:
+            print("Error: PDF file {} could not be read: {}".format(file, e))
+            return None
+
+    @staticmethod
+    def _get_metadata(reader):
+        return {k: str(v) for k, v in (reader.metadata or {}).items()}
+
+
+# available backends
+backends = {
+    TikaBackend.name: TikaBackend,
+    LocalBackend.name: LocalBackend,
+}
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Regex Benchmark
+===========================================
+Times each Regex pattern, the patterns of the old implementation,
+the section index and the extracted text clean-up against a synthetic
+article corpus and adversarial inputs (malformed Tika output)
+ * Usage: python benchmark.py [-repeat N] [-budget SECONDS]
+ * Patterns exceeding the time budget are reported as '>budget'
+"""
+
+import re
+import sys
+import time
+import utils
+from regex import regex
+from sections import Sections
+
+# ----------------------------------------
+# synthetic article text (markers as inserted in extracted text)
+header = """Paper Title Here
+Alice Smith1, Bob Q. Jones2
+1University of Alpha
+2Beta Institute
+alice@alpha.edu
+"""
+abstract = """ABSTRACT
+======abstract-start======
+We present a method for "doing things" that are quite interesting. We evaluate the hyphen- ated method on
+several data sets. 1. First finding. 2. Second finding.
+ ======abstract-end======
+"""
+index = """======index-start======
+• Human-centered computing → Human computer interaction (HCI); • Computing methodologies → Computer graphics.
+ ======index-end======
+"""
+categories = """Categories and Subject Descriptors
+H.5.2 [Information Interfaces]: User Interfaces; I.3.3 [Computer Graphics]: Picture generation
+General Terms
+Design, Human Factors
+"""
+keywords = """======keywords-start======
+Keywords: visualization, interaction; rendering
+ ======keywords-end======
+"""
+body = """1 INTRODUCTION
+Body text goes here, with ﬁgures and ﬂows and "quoted" terms.
+"""
+
+
+def reference(n):
+    return "[{}] A. Author. A paper title {}. In Proc. of something, 2001. https://doi.org/10.1145/ {}.\n".format(
+        n, n, 12345 + n)
+
+
+def references(n):
+    return "======references-start======\n" + ''.join(reference(i + 1) for i in range(n))
+
+
+# ----------------------------------------
+# patterns of the old implementation (removed from Regex), kept for comparison
+legacy = {
+    # text clean-up (see utils.clean_text)
+    'ws_top': re.compile(r"^[\r\n\t ]+"),
+    'dq': re.compile(r"(\")(?=[^>]*<)"),
+    'sq': re.compile(r"(\")(?=[^>]*<)"),
+    'fi': re.compile(r"(&#64257;|\ufb01)"),
+    'fl': re.compile(r"(&#64258;|\ufb02)"),
+    'dingbats1': re.compile(u"[\u2702-\u27b0]+", re.UNICODE),
+    'dingbats2': re.compile(u"[\u2020]+", re.UNICODE),
+    # sections (see Sections)
+    'above_abstract': re.compile(r"^((.|\n)*?)(?=^abstract)", re.IGNORECASE | re.MULTILINE),
+    'select_abstract': re.compile(
+        r"(^\s?======abstract-start======\n)([\s\S]*?)(?=^\s======abstract-end======\n)", re.IGNORECASE | re.MULTILINE),
+    'kws': re.compile(
+        r"(^\s?======keywords-start======\n?)([\s\S]*)(?=^\s?======keywords-end======\n)", re.IGNORECASE | re.MULTILINE),
+    'cats': re.compile(
+        r"(categories and subject descriptors?)((.|\n)*?)(([1]\s*)?introduction|([1]\s*)?keywords)", re.IGNORECASE),
+    'gts': re.compile(r"(general terms)((.|\n)*)(keywords)", re.IGNORECASE),
+    'ccs': re.compile(r"(^\s?======index-start======)([\s\S]*?)(?=^\s======index-end======)", re.IGNORECASE | re.MULTILINE),
+    # references (see Extractor.ref)
+    'ref_below': re.compile(r"(^\s?======references-start======\n?)([\s\S]*)", re.IGNORECASE | re.MULTILINE),
+    'ref_part': re.compile(r"(^{})(\d\d?)({})([\s\S]*?)(?=^{}\d\d?{})".format(
+        regex.m1, regex.m2, regex.m1, regex.m2), re.IGNORECASE | re.MULTILINE),
+    'ref_split': re.compile(r"(?<=^{})([\s\S]*?)(?={})".format(regex.m1, regex.m2), re.IGNORECASE | re.MULTILINE),
+    'ref_truc': re.compile(r"^([\s\S]*?)(\.$)", re.IGNORECASE | re.MULTILINE),
+    'ref_last': re.compile(r"(?<=^{})(\d\d?)({})([\s\S]*)(\.$)".format(
+        regex.m1, regex.m2), re.IGNORECASE | re.MULTILINE),
+}
+
+
+# ----------------------------------------
+# benchmark corpora
+def get_corpora():
+    article = header + abstract + index + categories + keywords + body * 50 + references(40)
+    long_references = references(2000)
+    return {
+        # well-formed article
+        'article': article,
+        # missing "keywords" heading and markers
+        'no_keywords': article.replace(keywords, '').replace('Keywords', ''),
+        # missing abstract heading
+        'no_abstract': article.replace('ABSTRACT\n', ''),
+        # ~200 KB references section
+        'long_references': header + long_references,
+        # references with numbers marked (see Extractor.ref) and no final period
+        'marked_references': regex.ref_numbers.sub(r"{}\2{}".format(regex.m1, regex.m2), long_references)[:-2],
+        # quotes without tags
+        'quotes': ('"quoted" text ' * 1000 + '\n') * 10,
+    }
+
+
+# ----------------------------------------
+# time function on text (best of repeat runs) [ms]; None if time budget exceeded
+def measure(fn, text, repeat, budget):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            with utils.time_limit(budget):
+                fn(text)
+        except utils.TimeLimitExceeded:
+            return None
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# ----------------------------------------
+# get option value from command line
+def get_option(flag, default):
+    if flag in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(flag) + 1])
+    return default
+
+
+def main():
+    repeat = get_option('-repeat', 3)
+    budget = get_option('-budget', 2.0)
+    corpora = get_corpora()
+
+    # all compiled patterns of Regex and old implementation, the section index and the text clean-up
+    patterns = [(name, pattern) for name, pattern in vars(regex).items() if hasattr(pattern, 'finditer')]
+    patterns += [('legacy ' + name, pattern) for name, pattern in legacy.items()]
+    tests = [(name, lambda text, p=pattern: list(p.finditer(text))) for name, pattern in patterns]
+    tests.append(('Sections', Sections))
+    # extracted text clean-up: whole document and line by line (see Extractor._clean_up)
+    tests.append(('clean_up', utils.clean_text))
+    tests.append(('clean_up (lines)', lambda text: [utils.clean_text(line) for line in text.split('\n')]))
+
+    print('Corpus sizes (chars): {}'.format(', '.join('{} {}'.format(k, len(v)) for k, v in corpora.items())))
+    print('Time per pattern [ms] (best of {}, budget {}s)\n'.format(repeat, budget))
+    print('{:<24}'.format('pattern') + ''.join('{:>18}'.format(k) for k in corpora))
+    for name, fn in tests:
+        results = [measure(fn, text, repeat, budget) for text in corpora.values()]
+        print('{:<24}'.format(name) + ''.join(
+            '{:>18}'.format('>budget' if r is None else '{:.2f}'.format(r)) for r in results))
+
+
+if __name__ == '__main__':
+    main()
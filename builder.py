@@ -6,26 +6,46 @@ XML builder
 ===========================================
 Converts JSON metadata to schematized XML
 """
+import os
+import time
+import hashlib
 import lxml
 import lxml.etree as et
 from params import params, Schema
 import utils
+from events import events
+from emitters import emitters
+
+XSL = 'http://www.w3.org/1999/XSL/Transform'
+XSD = 'http://www.w3.org/2001/XMLSchema'
 
 
 class XMLBuilder:
 
     def __init__(self):
         self.parser = et.XMLParser(remove_blank_text=True)
-        # initialize schema
-        if params.schema:
-            print('Initializing builder schema...'.format(params.schema), end='')
-            if params.schema == Schema.BITS:
-                self.schema = lxml.etree.XMLSchema(et.parse(params.paths['schema']['bits']))
-            elif params.schema == Schema.DATACITE:
-                self.schema = lxml.etree.XMLSchema(et.parse(params.paths['schema']['datacite']))
-            elif params.schema == Schema.WORDPRESS:
-                self.schema = lxml.etree.XMLSchema(et.parse(params.paths['schema']['wordpress']))
-            print('done.')
+        # compiled XSLT stylesheets: path -> (modification times of stylesheet files, XSLT)
+        self.xslt_cache = {}
+        # XSD schema (compiled on first validation, see get_schema()) and digests of schema files
+        self.schema = None
+        self.schema_version = None
+        # validation policy: all, sample (of sample size), changed-only or none (see validation in config.json)
+        self.policy, _, sample = params.validation['policy'].partition(':')
+        self.sample = int(sample or 0)
+        # native emitter of schema (XSLT template is applied otherwise)
+        self.emitter = None
+        if params.schema and params.emitters.get(params.schema.name.lower()) == 'native':
+            if params.schema.name.lower() not in emitters:
+                print('No native emitter available for schema {}.'.format(params.schema.name))
+                exit(1)
+            self.emitter = emitters[params.schema.name.lower()]()
+        # native emitter and XSLT template are compared only for schemas with native emitter
+        if params.compare_emitters and (not params.schema or params.schema.name.lower() not in emitters):
+            print('Option -compare-emitters requires a schema with native emitter ({}).'.format(
+                ', '.join(sorted(emitters))))
+            exit(1)
+            events.log("Native {} emitter: raw generic XML files (xml output path) are not saved.".format(
+                self.emitter.name), events.QUIET)
 
     # ----------------------------------------
     # Build XML from metadata (JSON-format)
@@ -76,28 +96,29 @@ class XMLBuilder:
 
     # ----------------------------------------
     # remove empty nodes from output tree
+    # (post-order walk: empty descendants are removed before their parent is visited,
+    # so a node is recursively empty if it has no text and only empty comments left)
     def remove_empty(self, tree):
-        # nodes that are recursively empty
         context = et.iterwalk(tree)
         for action, node in context:
             parent = node.getparent()
-            if self._recursively_empty(node):
+            if parent is not None and self._is_empty(node):
                 parent.remove(node)
         return tree
 
     # ----------------------------------------
-    # Remove empty nodes from node tree (helper function)
-    def _recursively_empty(self, node):
+    # Check if node is empty (helper function)
+    def _is_empty(self, node):
         if node.text or node.tag in params.empty_nodes:
             return False
-        return all((self._recursively_empty(c) for c in node.iterchildren()))
+        # remaining child elements are not empty
+        return all(not isinstance(c.tag, str) and not c.text for c in node.iterchildren())
 
     # --------------------------------------
     # Apply input XSLT template (see paths.json)
     def transform(self, xml_data, xslt_path):
         # load configured XSLT stylesheet
-        xslt_root = et.parse(xslt_path)
-        _transform_ = et.XSLT(xslt_root)
+        _transform_ = self.get_xslt(xslt_path)
         # xml = et.parse(xml_data, parser=self.parser).getroot()
         result = None
         try:
@@ -108,17 +129,162 @@ class XMLBuilder:
 
         return result
 
+    # --------------------------------------
+    # Canonical form (C14N) of XML document after empty nodes are removed (see compare())
+    def canonical(self, xml):
+        return et.tostring(self.remove_empty(xml), method='c14n')
+
+    # --------------------------------------
+    # Compare native emitter and XSLT template output of articles (no output is generated)
+    # - outputs are compared in canonical form (see canonical())
+    # - times are best of 5 runs (XSLT: including generic tree build)
+    def compare(self, articles, xslt_path):
+        emitter = emitters[params.schema.name.lower()]()
+        print("Comparing {} emitter and XSLT template ({}) on {} articles ...".format(
+            emitter.name, xslt_path, len(articles)))
+        times = {'native': 0., 'xslt': 0.}
+        n_identical = 0
+        for article_id, data in articles:
+            outputs = {}
+            best = {}
+            for name, convert in (('native', lambda: emitter.emit(data)),
+                                  ('xslt', lambda: self.transform(self.build(data), xslt_path))):
+                for _ in range(5):
+                    start = time.perf_counter()
+                    outputs[name] = convert()
+                    elapsed = time.perf_counter() - start
+                    best[name] = min(best.get(name, elapsed), elapsed)
+                times[name] += best[name]
+            native, xslt = [self.canonical(outputs[name]) for name in times]
+            n_identical += native == xslt
+            print("{}: {} ({:.2f} ms native, {:.2f} ms XSLT)".format(
+                article_id, 'IDENTICAL' if native == xslt else 'DIFFERENT', best['native'] * 1000, best['xslt'] * 1000))
+
+        print("\nEmitter Comparison Report:")
+        print("Identical outputs: {} of {}".format(n_identical, len(articles)))
+        for name, seconds in times.items():
+            print("{}: {:.2f} ms ({:.3f} ms per article)".format(
+                name, seconds * 1000, seconds * 1000 / max(len(articles), 1)))
+        if times['native']:
+            print("Speedup: {:.1f}x".format(times['xslt'] / times['native']))
+
+    # --------------------------------------
+    # Get compiled XSLT stylesheet (compiled again if stylesheet or imported files changed)
+    def get_xslt(self, xslt_path):
+        path = os.path.abspath(xslt_path)
+        if path in self.xslt_cache:
+            mtimes, xslt = self.xslt_cache[path]
+            if all(self._get_mtime(f) == mtime for f, mtime in mtimes.items()):
+                return xslt
+        xslt_root = et.parse(path)
+        xslt = et.XSLT(xslt_root)
+        self.xslt_cache[path] = ({f: self._get_mtime(f) for f in self.get_templates(path)}, xslt)
+        return xslt
+
+    # --------------------------------------
+    # Digests of stylesheet and imported/included files
+    def get_template_version(self, xslt_path):
+        return [utils.get_digest(f) for f in self.get_templates(xslt_path) if os.path.isfile(f)]
+
+    # --------------------------------------
+    # List stylesheet and files it imports/includes (recursively)
+    def get_templates(self, xslt_path):
+        templates = [os.path.abspath(xslt_path)]
+        for template in templates:
+            try:
+                root = et.parse(template)
+            except (OSError, et.XMLSyntaxError):
+                continue
+            for node in root.getroot().iterchildren('{{{}}}import'.format(XSL), '{{{}}}include'.format(XSL)):
+                href = os.path.abspath(os.path.join(os.path.dirname(template), node.get('href')))
+                if href not in templates:
+                    templates.append(href)
+        return templates
+
+    # --------------------------------------
+    # Get file modification time (None if missing)
+    @staticmethod
+    def _get_mtime(file):
+        try:
+            return os.stat(file).st_mtime_ns
+        except OSError:
+            return None
+
+    # ----------------------------------------
+    # Get XSD schema of selected schema (compiled on first use)
+    def get_schema(self):
+        if self.schema is None:
+            events.log('Initializing builder schema...', end='')
+            self.schema = lxml.etree.XMLSchema(et.parse(params.paths['schema'][params.schema.name.lower()]))
+            events.log('done.')
+        return self.schema
+
+    # --------------------------------------
+    # Digests of schema and included/imported schema files (local files)
+    def get_schema_version(self):
+        if self.schema_version is None:
+            self.schema_version = [utils.get_digest(f) for f in self.get_schemas(
+                params.paths['schema'][params.schema.name.lower()]) if os.path.isfile(f)]
+        return self.schema_version
+
+    # --------------------------------------
+    # List schema and files it includes/imports/redefines (recursively; remote schemas are not listed)
+    def get_schemas(self, xsd_path):
+        schemas = [os.path.abspath(xsd_path)]
+        for schema in schemas:
+            try:
+                root = et.parse(schema)
+            except (OSError, et.XMLSyntaxError):
+                continue
+            for node in root.getroot().iterchildren('{{{}}}include'.format(XSD), '{{{}}}import'.format(XSD),
+                                                    '{{{}}}redefine'.format(XSD)):
+                location = node.get('schemaLocation')
+                if not location or '://' in location:
+                    continue
+                href = os.path.abspath(os.path.join(os.path.dirname(schema), location))
+                if href not in schemas:
+                    schemas.append(href)
+        return schemas
+
+    # ----------------------------------------
+    # Digest of document and schema version (identifies validated documents)
+    def get_validation_digest(self, xml_data):
+        sha = hashlib.sha256(et.tostring(xml_data, method='c14n'))
+        for digest in self.get_schema_version():
+            sha.update(digest.encode('utf-8'))
+        return sha.hexdigest()
+
+    # ----------------------------------------
+    # validate document according to validation policy
+    # - selected: document is in validated sample (sample policy)
+    # - validated: digest of last valid document (changed-only policy: valid documents are not validated again)
+    # - returns validation result (None if not validated), last error and digest of validated document
+    def check(self, xml_data, selected=True, validated=None):
+        if self.policy == 'none' or not selected:
+            events.log("XSD Validation: NOT VALIDATED")
+            return None, None, None
+        digest = self.get_validation_digest(xml_data)
+        if self.policy == 'changed-only' and digest == validated:
+            events.log("XSD Validation: VALID (unchanged)")
+            return True, None, digest
+        return self.validate(xml_data) + (digest,)
+
     # ----------------------------------------
     # validate document against XSD schema (see paths.json)
+    # - returns validation result and last error (if any)
     def validate(self, xml_data):
-        validation = self.schema.validate(xml_data)
+        schema = self.get_schema()
+        validation = schema.validate(xml_data)
         msg = 'VALID' if validation else 'NOT VALID'
-        print("XSD Validation: {}".format(msg))
+        events.log("XSD Validation: {}".format(msg))
         # show validation errors
-        if len(self.schema.error_log):
-            print('\n-------------------\nERROR LOGS:')
-            print(self.schema.error_log.last_error)
-            print()
+        error = None
+        if len(schema.error_log):
+            error = str(schema.error_log.last_error)
+            events.log('\n-------------------\nERROR LOGS:')
+            events.log(error)
+            events.log('')
+        return validation, error
 
 
 # -- end of Builder class --
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Extraction Cache
+===========================================
+Persistent content-addressed store for cleaned PDF text
+ * Entries are keyed by the SHA-256 digest of the PDF and the extraction version
+ * Least recently used entries are evicted when the cache exceeds its size limit
+"""
+
+import os
+import hashlib
+
+
+class Cache:
+
+    def __init__(self, path, max_size):
+        self.path = path
+        # maximum cache size [bytes]
+        self.max_size = max_size
+        # total size of entries [bytes] (scanned on first put, then tracked; see evict())
+        self.size = None
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+
+    # ----------------------------------------
+    # cache key for file digest and extraction version
+    @staticmethod
+    def key(digest, version):
+        return hashlib.sha256("{}:{}".format(digest, version).encode()).hexdigest()
+
+    # ----------------------------------------
+    # get cached text (None if not cached)
+    def get(self, key):
+        entry = os.path.join(self.path, key + '.txt')
+        try:
+            with open(entry, 'r', encoding='utf-8') as fp:
+                data = fp.read()
+            # mark entry as recently used
+            os.utime(entry)
+            return data
+        except FileNotFoundError:
+            return None
+
+    # ----------------------------------------
+    # check if text is cached
+    def has(self, key):
+        return os.path.isfile(os.path.join(self.path, key + '.txt'))
+
+    # ----------------------------------------
+    # add text to cache
+    # - entries are only scanned and evicted once the tracked total size exceeds the limit
+    def put(self, key, data):
+        entry = os.path.join(self.path, key + '.txt')
+        if self.size is None:
+            self.size = sum(size for mtime, size, path in self._entries())
+        # write to temporary file first (concurrent workers may share the cache)
+        tmp = "{}.{}.tmp".format(entry, os.getpid())
+        with open(tmp, 'w', encoding='utf-8') as fp:
+            fp.write(data)
+        self.size += os.path.getsize(tmp)
+        try:
+            self.size -= os.path.getsize(entry)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, entry)
+        if self.size > self.max_size:
+            self.evict()
+
+    # ----------------------------------------
+    # remove least recently used entries above size limit
+    # - entries are removed down to 90% of the limit, so the cache is not scanned on every put once full
+    # - total size is rescanned, as concurrent workers add entries too
+    def evict(self):
+        entries = self._entries()
+        total = sum(size for mtime, size, path in entries)
+        if total <= self.max_size:
+            self.size = total
+            return
+        # oldest entries first
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+
+    # ----------------------------------------
+    # cache entries: (modification time, size, path)
+    def _entries(self):
+        entries = []
+        with os.scandir(self.path) as it:
+            for e in it:
+                if e.is_file() and e.name.endswith('.txt'):
+                    stat = e.stat()
+                    entries.append((stat.st_mtime, stat.st_size, e.path))
+        return entries
@@ -6,27 +6,234 @@ Created on Sat May  4 21:43:26 2019
 @author: boutrous
 """
 
+import os
+import pickle
+from bisect import bisect_right
+from collections import OrderedDict
 import lxml.etree as et
+import utils
 from params import params
 
+# file lock of concept lookups file (not available on Windows, see save_memo())
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 class CCS:
 
+    # snapshot format revision (increment when indexes change)
+    snapshot_version = 2
+    # indexes stored in snapshot
+    snapshot_fields = ['valid_top_concepts', 'concepts', 'concept_ids', 'broader', 'pref_labels', 'label_index',
+                       'labels', 'label_offsets', 'label_concepts', 'cat_index',
+                       'cat_codes', 'cat_children']
+
     def __init__(self):
-        # load ACM classification categories
-        self.skos = et.parse(params.paths['taxonomy']['CCS2012']).getroot()
         # CCS2012 taxonomy namespace mapping
         self.nsmap = {
             'skos': 'http://www.w3.org/2004/02/skos/core#',
             'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
         }
+        # digests of taxonomy source files
+        self.sources = {name: utils.get_digest(path) for name, path in params.paths['taxonomy'].items()}
+        # load indexes from snapshot (rebuilt if taxonomy files changed)
+        if not self._load_snapshot():
+            self._init_taxonomy()
+            self._save_snapshot()
+        self.logger = []
+        # memoized concept lookups (LRU): (top concept, bottom concept) -> (ID, description, significance, logs)
+        self.memo = OrderedDict()
+        self.memo_size = params.concepts['size']
+        self.memo_path = os.path.join(params.paths['root'], params.concepts['path']) \
+            if params.concepts.get('path') else None
+        self.memo_changed = False
+        self._load_memo()
+
+    # --------------------------------------------
+    # Load ACM classification categories and build indexes
+    def _init_taxonomy(self):
+        skos = et.parse(params.paths['taxonomy']['CCS2012']).getroot()
         # get list of top concepts
         self.valid_top_concepts = \
-            self.skos.xpath('//skos:ConceptScheme/skos:hasTopConcept/@rdf:resource', namespaces=self.nsmap)
-        self.cat_index = et.parse(params.paths['taxonomy']['acm']).getroot()
-        self.logger = []
+            set(skos.xpath('//skos:ConceptScheme/skos:hasTopConcept/@rdf:resource', namespaces=self.nsmap))
+        # build concept indexes
+        self._init_index(skos)
+        # ACM 1998 categories: code -> name
+        self.cat_index = {}
+        # normalized code -> code
+        self.cat_codes = {}
+        # normalized code -> subcategory codes
+        self.cat_children = {}
+        for cat in et.parse(params.paths['taxonomy']['acm']).getroot().iterchildren('category'):
+            cat_node = cat.findtext('cat_node', default='')
+            if cat_node not in self.cat_index:
+                self.cat_index[cat_node] = cat.findtext('name') or ''
+            key = self.normalize_category(cat_node)
+            if key not in self.cat_codes:
+                self.cat_codes[key] = cat_node
+                if '.' in key:
+                    self.cat_children.setdefault(key.rsplit('.', 1)[0], []).append(cat_node)
+
+    # --------------------------------------------
+    # Load indexes from snapshot file
+    def _load_snapshot(self):
+        try:
+            with open(params.snapshot['path'], 'rb') as fp:
+                snapshot = pickle.load(fp)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+        if snapshot.get('version') != self.snapshot_version or snapshot.get('sources') != self.sources:
+            return False
+        for field in self.snapshot_fields:
+            setattr(self, field, snapshot['indexes'][field])
+        return True
+
+    # --------------------------------------------
+    # Save indexes to snapshot file
+    def _save_snapshot(self):
+        snapshot = {
+            'version': self.snapshot_version,
+            'sources': self.sources,
+            'indexes': {field: getattr(self, field) for field in self.snapshot_fields}
+        }
+        tmp = "{}.{}.tmp".format(params.snapshot['path'], os.getpid())
+        try:
+            with open(tmp, 'wb') as fp:
+                pickle.dump(snapshot, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, params.snapshot['path'])
+        except OSError as e:
+            print("Taxonomy snapshot could not be saved: {}".format(e))
+
+    # --------------------------------------------
+    # Index concepts of taxonomy
+    # - concepts: concept ID -> position in taxonomy
+    # - concept_ids: position in taxonomy -> concept ID
+    # - broader: concept ID -> broader concept IDs
+    # - pref_labels: concept ID -> preferred label
+    # - label_index: label (preferred, alternative, hidden, scope note) -> concept IDs
+    # - labels: all labels (newline-delimited) for substring lookup
+    def _init_index(self, skos):
+        self.concepts = {}
+        self.concept_ids = []
+        self.broader = {}
+        self.pref_labels = {}
+        self.label_index = {}
+        labels = []
+        # label positions in labels string and corresponding concept positions
+        self.label_offsets = []
+        self.label_concepts = []
+        offset = 0
+        about = '{{{}}}about'.format(self.nsmap['rdf'])
+        resource = '{{{}}}resource'.format(self.nsmap['rdf'])
+        broader = '{{{}}}broader'.format(self.nsmap['skos'])
+        pref_label = '{{{}}}prefLabel'.format(self.nsmap['skos'])
+        for i, concept in enumerate(skos.iterchildren('{{{}}}Concept'.format(self.nsmap['skos']))):
+            concept_id = concept.get(about)
+            self.concepts[concept_id] = i
+            self.concept_ids.append(concept_id)
+            self.broader[concept_id] = []
+            for node in concept.iterchildren():
+                if node.tag == broader:
+                    self.broader[concept_id].append(node.get(resource))
+                elif node.tag == pref_label and concept_id not in self.pref_labels:
+                    self.pref_labels[concept_id] = node.text
+                # text nodes (labels, notes) are searchable
+                if node.text:
+                    self.label_index.setdefault(node.text, []).append(concept_id)
+                    labels.append(node.text)
+                    self.label_offsets.append(offset)
+                    self.label_concepts.append(i)
+                    offset += len(node.text) + 1
+        self.labels = '\n'.join(labels)
+
+    # --------------------------------------------
+    # Find concept IDs with label matching text (in taxonomy order)
+    # - exact: label equals text; otherwise label contains text
+    def find_concepts(self, text, exact=False):
+        if exact:
+            return list(self.label_index.get(text, []))
+        matches = set()
+        if text and '\n' not in text:
+            idx = self.labels.find(text)
+            while idx >= 0:
+                matches.add(self.label_concepts[bisect_right(self.label_offsets, idx) - 1])
+                idx = self.labels.find(text, idx + 1)
+        return [self.concept_ids[i] for i in sorted(matches)]
+
+    # --------------------------------------------
+    # Load memoized concept lookups from file
+    def _load_memo(self):
+        for key, result in self._read_memo():
+            self.memo[key] = result
+        while len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
 
+    # --------------------------------------------
+    # Read memoized concept lookups (empty if taxonomy changed)
+    def _read_memo(self):
+        if not self.memo_path:
+            return []
+        try:
+            with open(self.memo_path, 'rb') as fp:
+                memo = pickle.load(fp)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return []
+        if memo.get('version') != self.snapshot_version or memo.get('sources') != self.sources:
+            return []
+        return memo['entries']
+
+    # --------------------------------------------
+    # Save memoized concept lookups to file (merged with lookups saved by other processes)
+    # - file is read, merged and replaced under a lock (worker processes save when they exit)
+    def save_memo(self):
+        if not self.memo_path or not self.memo_changed:
+            return
+        tmp = "{}.{}.tmp".format(self.memo_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.memo_path), exist_ok=True)
+            with open(self.memo_path + '.lock', 'a') as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                memo = OrderedDict(self._read_memo())
+                for key, result in self.memo.items():
+                    memo.pop(key, None)
+                    memo[key] = result
+                entries = list(memo.items())[-self.memo_size:]
+                with open(tmp, 'wb') as fp:
+                    pickle.dump({'version': self.snapshot_version, 'sources': self.sources, 'entries': entries}, fp,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.memo_path)
+            self.memo_changed = False
+        except OSError as e:
+            print("Concept lookups could not be saved: {}".format(e))
+
+    # --------------------------------------------
+    # Look up concept path (memoized)
+    # - concepts: extracted concept group (top ... bottom concept)
+    # - returns concept ID, description, significance and logs
     def lookup(self, concepts):
+        # result only depends on top and bottom concepts
+        key = (concepts[0], concepts[-1]) if concepts else ()
+        # (memo is not interrupted by parse time budget, see utils.uninterrupted())
+        if key in self.memo:
+            with utils.uninterrupted():
+                self.memo.move_to_end(key)
+            concept_id, concept_desc, concept_significance, logs = self.memo[key]
+            self.logger = list(logs)
+            return concept_id, concept_desc, concept_significance, self.logger
+        concept_id, concept_desc, concept_significance, logs = self._lookup(concepts)
+        with utils.uninterrupted():
+            self.memo[key] = (concept_id, concept_desc, concept_significance, tuple(logs))
+            self.memo_changed = True
+            if len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+        return concept_id, concept_desc, concept_significance, logs
+
+    # --------------------------------------------
+    # Look up concept path in taxonomy
+    def _lookup(self, concepts):
 
         # clear logs
         self.clear_logs()
@@ -36,7 +243,7 @@ class CCS:
 
         # initialize
         top_concept_id = None
-        bottom_concepts = []
+        bottom_concept_ids = []
         concept_significance = 500  # default weight
 
         # clean raw concept text extraction
@@ -51,11 +258,9 @@ class CCS:
 
         # test possible variations of top concept
         for top_cpt_candidate in top_concept_candidates:
-            top_concepts = \
-                self.skos.xpath('//*[contains(text(), "' + top_cpt_candidate + '")]/..', namespaces=self.nsmap)
-            for top_concept in top_concepts:
-                if self.get_concept_id(top_concept) in self.valid_top_concepts:
-                    top_concept_id = self.get_concept_id(top_concept)
+            for concept_id in self.find_concepts(top_cpt_candidate):
+                if concept_id in self.valid_top_concepts:
+                    top_concept_id = concept_id
                     break
             if top_concept_id:
                 break
@@ -69,14 +274,12 @@ class CCS:
         # test variations of bottom concept
         for bottom_cpt_candidate in bottom_concept_candidates:
             # Retrieve broadest and narrows concepts
-            bottom_concepts += \
-                self.skos.xpath('//*[contains(text(), "' + bottom_cpt_candidate + '")]/..', namespaces=self.nsmap)
+            bottom_concept_ids += self.find_concepts(bottom_cpt_candidate)
 
-        if not bottom_concepts:
+        if not bottom_concept_ids:
             self.log('Bottom concepts invalid')
             return None, None, None, self.logger
         else:
-            bottom_concept_ids = [self.get_concept_id(c) for c in bottom_concepts]
             self.log("Bottom concepts validated", bottom_concept_ids)
 
         # Find possible node paths from bottom to top concepts
@@ -101,7 +304,7 @@ class CCS:
         # front item is current ID
         current_concept_id = concept_path[0]
         # concepts up the tree
-        broader_concept_ids = self.get_broader_ids(self.get_concept(current_concept_id))
+        broader_concept_ids = self.get_broader_ids(current_concept_id)
         self.log("Top: {}, Current: {}, Broader: {}, Path: {}".format(
             top_concept_id, current_concept_id, broader_concept_ids, concept_path))
 
@@ -122,32 +325,49 @@ class CCS:
         return None
 
     # --------------------------------------------
-    def get_concept_id(self, concept):
-        concept_id = concept.xpath('@rdf:about', namespaces=self.nsmap)
-        return concept_id[0] if id else None
+    def get_broader_ids(self, concept_id):
+        return list(self.broader.get(concept_id, []))
 
     # --------------------------------------------
-    def get_concept(self, concept_id):
-        concept = self.skos.xpath('.//skos:Concept[@rdf:about="' + concept_id + '"]', namespaces=self.nsmap)
-        return concept[0] if concept else None
+    def get_concept_desc(self, concept_id):
+        return self.pref_labels.get(concept_id)
 
     # --------------------------------------------
-    def get_broader_ids(self, concept):
-        return concept.xpath('.//skos:broader/@rdf:resource', namespaces=self.nsmap)
+    # Get name of ACM 1998 category ('' if invalid)
+    def get_category(self, cat_node):
+        return self.cat_index.get(self.find_category(cat_node), '')
 
     # --------------------------------------------
-    def get_concept_desc(self, concept_id):
-        concept = self.get_concept(concept_id)
-        concept_desc = concept.xpath('.//skos:prefLabel/text()', namespaces=self.nsmap)[0]
-        return concept_desc if concept_desc else None
+    # Normalize ACM 1998 category code (e.g. 'h.5.m.' -> 'H.5.M')
+    @staticmethod
+    def normalize_category(cat_node):
+        return ''.join(cat_node.split()).rstrip('.').upper()
 
     # --------------------------------------------
-    def get_category(self, cat_node):
-        cat = self.cat_index.xpath('/categories/category[cat_node="' + cat_node + '"]/name/text()')
-        if len(cat) > 0:
-            return cat[0]
-        else:
-            return ''
+    # Get ACM 1998 category code as listed in taxonomy (None if invalid)
+    def find_category(self, cat_node):
+        return self.cat_codes.get(self.normalize_category(cat_node))
+
+    # --------------------------------------------
+    # Get subcategory codes of ACM 1998 category (e.g. 'H.5' -> ['H.5.0', 'H.5.1', ...])
+    # - recursive: include all descendants
+    def get_subcategories(self, cat_node, recursive=False):
+        subcategories = []
+        for child in self.cat_children.get(self.normalize_category(cat_node), []):
+            subcategories.append(child)
+            if recursive:
+                subcategories += self.get_subcategories(child, recursive)
+        return subcategories
+
+    # --------------------------------------------
+    # Get nearest valid parent code of ACM 1998 category (e.g. 'H.5.9' -> 'H.5'; None if not found)
+    def get_parent_category(self, cat_node):
+        key = self.normalize_category(cat_node)
+        while '.' in key:
+            key = key.rsplit('.', 1)[0]
+            if key in self.cat_codes:
+                return self.cat_codes[key]
+        return None
 
     # ----------------------------------------
     # log issues
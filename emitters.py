@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Native Emitters
+===========================================
+Write schematized XML directly from JSON metadata (no generic XML tree or XSLT)
+ * datacite: DataCite 4 resource (same output as templates/datacite.xsl)
+Values are selected as the stylesheet selects them from the generic tree
+built by XMLBuilder, so both paths produce the same document.
+"""
+
+import abc
+import lxml.etree as et
+from params import params
+
+# nodes with encoded URLs (see utils.process)
+URL_TAGS = ('publisher_article_url', 'publisher_url', 'conference_url', 'url')
+
+
+# ----------------------------------------
+# check if empty value is written as node (see params.empty_nodes)
+def _is_empty_node(name):
+    return params.empty_nodes == 'any' or (type(params.empty_nodes) == list and name in params.empty_nodes)
+
+
+# ----------------------------------------
+# child nodes of generic tree node (see XMLBuilder._build_node)
+# - node: (tag, value, is_text)
+def _items(node):
+    tag, value, is_text = node
+    if is_text or not value:
+        return
+    if type(value) == dict:
+        for k, e in value.items():
+            if e or _is_empty_node(k):
+                yield str(k), e, type(e) == str or type(e) == int
+    elif type(value) == list:
+        for e in value:
+            if e:
+                yield params.element_name, e, type(e) == str
+
+
+# ----------------------------------------
+# child node of dict node (None if missing; metadata is JSON, so keys are strings)
+def _child(node, name):
+    tag, value, is_text = node
+    if not is_text and value and type(value) == dict and name in value:
+        e = value[name]
+        if e or _is_empty_node(name):
+            return name, e, type(e) == str or type(e) == int
+    return None
+
+
+# ----------------------------------------
+# nodes selected by XPath location path (child steps only)
+def select(node, path):
+    nodes = [node]
+    for name in path.split('/'):
+        nodes = [child for n in nodes for child in _items(n) if child[0] == name]
+    return nodes
+
+
+# ----------------------------------------
+# string value of generic tree node (text of all descendants)
+def _string(node):
+    tag, value, is_text = node
+    if is_text:
+        if not value:
+            return ''
+        return value.replace("&", "%26") if tag in URL_TAGS else str(value)
+    return ''.join(_string(child) for child in _items(node))
+
+
+# ----------------------------------------
+# string value of first selected node (xsl:value-of)
+# - dict steps are looked up directly (first node in document order of list steps)
+def value_of(node, path):
+    steps = path.split('/')
+    for k, name in enumerate(steps):
+        if type(node[1]) == list:
+            nodes = select(node, '/'.join(steps[k:]))
+            return _string(nodes[0]) if nodes else ''
+        node = _child(node, name)
+        if node is None:
+            return ''
+    return _string(node)
+
+
+class Emitter(abc.ABC):
+
+    name = None
+    # emitter version (part of build manifest digest instead of template version)
+    version = None
+
+    def __init__(self):
+        self.parser = et.XMLParser(remove_blank_text=True)
+
+    # ----------------------------------------
+    # returns XML document of metadata
+    # - XML text is written directly and parsed once
+    def emit(self, data):
+        out = []
+        self._write(data, out)
+        return et.ElementTree(et.fromstring(''.join(out), self.parser))
+
+    # ----------------------------------------
+    # write XML text of metadata to output list
+    @abc.abstractmethod
+    def _write(self, data, out):
+        pass
+
+    # ----------------------------------------
+    # write element with text (empty text is not written, as in XSLT output)
+    # - attrs: serialized attributes
+    @staticmethod
+    def _element(out, tag, text='', attrs=''):
+        if text:
+            # (carriage returns are escaped to be kept by parser)
+            text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+            out.append('<' + tag + attrs + '>' + text + '</' + tag + '>')
+        else:
+            out.append('<' + tag + attrs + '/>')
+
+
+class DataCiteEmitter(Emitter):
+
+    name = 'datacite'
+    version = 'datacite-native-1'
+    resource = '<resource xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" ' \
+               'xmlns="http://datacite.org/schema/kernel-4" xsi:schemaLocation="http://datacite.org/schema/kernel-4 ' \
+               'http://schema.datacite.org/meta/kernel-4.3/metadata.xsd">'
+    rights = "All rights reserved. No part of the material protected by this copyright notice may be reproduced or " \
+             "utilized in any form, electronic or mechanical, including photocopying, recording, or by any " \
+             "information storage and retreival system, without written permission from the copyright owner."
+
+    def _write(self, data, out):
+        add = self._element
+        md = ('root', data, False)
+        out.append(self.resource)
+        add(out, 'identifier', '{}/{}'.format(value_of(md, 'publication/collection_id'), value_of(md, 'doi')),
+            ' identifierType="DOI"')
+        out.append('<creators>')
+        for author in select(md, 'authors/element'):
+            self._write_person(out, 'creator', author)
+        out.append('</creators><titles>')
+        add(out, 'title', value_of(md, 'title'), ' xml:lang="en-ca"')
+        out.append('</titles>')
+        add(out, 'publisher', value_of(md, 'publisher/name'))
+        add(out, 'publicationYear', value_of(md, 'conference/year'))
+        out.append('<subjects>')
+        add(out, 'subject', '000 computer science',
+            ' xml:lang="en-ca" schemeURI="http://dewey.info/" subjectScheme="dewey"')
+        for keyword in select(md, 'keywords/element'):
+            add(out, 'subject', value_of(keyword, 'kw'), ' xml:lang="en-ca" subjectScheme="keywords"')
+        out.append('</subjects><contributors>')
+        for chair in select(md, 'chairs/element'):
+            self._write_person(out, 'contributor', chair, ' contributorType="Editor"')
+        out.append('</contributors><dates>')
+        add(out, 'date', value_of(md, 'publication/copyright/year'), ' dateType="Copyrighted"')
+        out.append('</dates><language>en-ca</language>'
+                   '<resourceType resourceTypeGeneral="Text">Conference Proceedings</resourceType>')
+        acm_doi = value_of(md, 'acm/doi')
+        if self._has_text(acm_doi):
+            out.append('<alternateIdentifiers>')
+            add(out, 'alternateIdentifier', acm_doi, ' alternateIdentifierType="ACM Digital Library DOI"')
+            out.append('</alternateIdentifiers>')
+        out.append('<relatedIdentifiers>')
+        add(out, 'relatedIdentifier', value_of(md, 'publication/issn'),
+            ' relatedIdentifierType="ISSN" relationType="IsPartOf"')
+        add(out, 'relatedIdentifier', value_of(md, 'publication/isbn'),
+            ' relatedIdentifierType="ISBN" relationType="IsPartOf"')
+        out.append('</relatedIdentifiers><sizes>')
+        add(out, 'size', '{} pages'.format(value_of(md, 'pages')))
+        add(out, 'size', value_of(md, 'file_size'))
+        out.append('</sizes><formats>')
+        add(out, 'format', value_of(md, 'file_format'))
+        out.append('</formats><rightsList>')
+        add(out, 'rights', self.rights)
+        out.append('</rightsList><descriptions>')
+        add(out, 'description', value_of(md, 'publication/description'),
+            ' xml:lang="en-ca" descriptionType="SeriesInformation"')
+        abstract = value_of(md, 'abstract')
+        if self._has_text(abstract):
+            add(out, 'description', abstract, ' xml:lang="en-ca" descriptionType="Abstract"')
+        out.append('</descriptions></resource>')
+
+    # ----------------------------------------
+    # write creator/contributor element of person node
+    def _write_person(self, out, tag, person, attrs=''):
+        first_name = value_of(person, 'first_name')
+        last_name = value_of(person, 'last_name')
+        out.append('<{}{}>'.format(tag, attrs))
+        self._element(out, tag + 'Name', '{}, {}'.format(last_name, first_name))
+        self._element(out, 'givenName', first_name)
+        self._element(out, 'familyName', last_name)
+        self._element(out, 'affiliation', value_of(person, 'affiliation'))
+        out.append('</{}>'.format(tag))
+
+    # ----------------------------------------
+    # check if text is not blank (XPath: not(normalize-space(text)=''))
+    @staticmethod
+    def _has_text(text):
+        return text.strip(' \t\r\n') != ''
+
+
+# available emitters (by schema name)
+emitters = {
+    DataCiteEmitter.name: DataCiteEmitter,
+}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Progress Events
+===========================================
+Console messages by verbosity level and structured event stream
+ * Levels: quiet (errors and summaries), info (progress display; default),
+   verbose (per-file messages), debug (raw extracted text)
+ * Events (progress, issues, timings) are written as JSON lines to a file
+   or file descriptor (see -events option)
+"""
+
+import os
+import json
+import time
+import multiprocessing
+
+
+class Events:
+
+    # verbosity levels
+    QUIET = 0
+    INFO = 1
+    VERBOSE = 2
+    DEBUG = 3
+
+    def __init__(self):
+        self.level = self.INFO
+        # event stream file descriptor (None: no event stream)
+        self.fd = None
+
+    # ----------------------------------------
+    # set verbosity level and event stream
+    # - target: file path or 'fd:N' (file descriptor N)
+    def configure(self, level, target=None):
+        self.level = level
+        if target is None:
+            return
+        if target.startswith('fd:'):
+            fd = int(target[3:])
+            # check that file descriptor is open
+            os.fstat(fd)
+            self.fd = fd
+        else:
+            # event file is truncated by main process only (worker processes append)
+            flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+            if multiprocessing.parent_process() is None:
+                flags |= os.O_TRUNC
+            self.fd = os.open(target, flags, 0o644)
+
+    # ----------------------------------------
+    # progress display is hidden in quiet mode
+    @property
+    def quiet(self):
+        return self.level <= self.QUIET
+
+    # ----------------------------------------
+    # print message at verbosity level
+    def log(self, message, level=VERBOSE, end='\n'):
+        if self.level >= level:
+            print(message, end=end)
+
+    # ----------------------------------------
+    # print message at debug level
+    def debug(self, message):
+        self.log(message, self.DEBUG)
+
+    # ----------------------------------------
+    # write event to event stream (one JSON object per line)
+    def emit(self, event, **data):
+        if self.fd is None:
+            return
+        record = dict(event=event, time=round(time.time(), 3), pid=os.getpid(), **data)
+        # single write per line (lines of concurrent workers are not interleaved)
+        os.write(self.fd, (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8'))
+
+
+# instantiate event stream (configured by parameters)
+events = Events()
@@ -6,18 +6,25 @@ Metadata Extractor
 Created on Tue Mar 12 22:24:07 2019
 
 @author: boutrous
- - Dependencies: tika
+ - Dependencies: tika (or pypdf, see backends)
 """
 import os
 import csv
 import re
 import json
-import unicodedata as ud
+import time
+import difflib
+from fnmatch import fnmatch
 import utils
+from backends import backends
+from events import events
+from store import store
+from cache import Cache
 from categories import ccs
-from tika import parser
-from params import params
+from params import params, Phases
 from regex import regex
+from sections import Sections
+from header import Header
 
 
 """
@@ -39,6 +46,27 @@ class Extractor:
         self.min_ref_length = 5
         # max number of pages for missing categories
         self.max_page_nocat = 2
+        # clean-up revision (increment when utils.clean_text output changes)
+        self.cleanup_version = 1
+        # extraction version (invalidates cached text; see get_version())
+        self.version = "clean-{}".format(self.cleanup_version)
+        # page-delimited extraction (see pdf()); pages are separated by form feeds
+        self.pages = params.pages
+        self.page_separator = '\f'
+        if self.pages['enabled']:
+            self.version += ":pages-{}-{}".format(self.pages['head'], self.pages['tail'])
+        # text extraction backends (initialized when used)
+        self.backends = {}
+        # persistent cache of cleaned PDF text
+        self.cache = None
+        if params.cache and params.phase == Phases.EXTRACT:
+            self.cache = Cache(os.path.join(params.paths['root'], params.cache['path']),
+                               params.cache['max_size'] * 1000000)
+        # PDFs extracted in this run: digest -> file path
+        # (text of identical PDFs is read from the cache, shared by worker processes)
+        self.extracted = {}
+        # parse time deadline of current document (see merge())
+        self.deadline = None
 
     # ----------------------------------------
     # Extract from CSV
@@ -90,13 +118,103 @@ class Extractor:
     # ----------------------------------------
     # - file: PDF filepath
     # - data: extracted CSV index metadata
+    # - digest: digest of file (computed if not given)
     # - returns data structure
     # ----------------------------------------
-    def pdf(self, file):
-        raw = parser.from_file(file)
-        print(raw["metadata"])
-        print(raw["content"])
-        return self._clean_up(raw["content"])
+    def pdf(self, file, digest=None):
+        digest = digest or utils.get_digest(file)
+        # use cached text for unchanged PDF (and byte-identical PDF extracted before)
+        key = Cache.key(digest, self.get_version(file))
+        content = self.cache.get(key) if self.cache else None
+        if content is not None and digest in self.extracted:
+            events.log("PDF {} is identical to {}.".format(file, self.extracted[digest]))
+        if content is None:
+            backend = self.get_backend(file)
+            # page-delimited text (pages separated by form feeds)
+            if self.pages['enabled']:
+                raw = backend.extract_pages(file, self.pages['head'], self.pages['tail'])
+                raw["content"] = self.page_separator.join(raw["pages"])
+            else:
+                raw = backend.extract(file)
+            events.debug(raw["metadata"])
+            events.debug(raw["content"])
+            content = self._clean_up(raw["content"] or '')
+            if self.cache:
+                self.cache.put(key, content)
+        self.extracted.setdefault(digest, file)
+        return content
+
+    # ----------------------------------------
+    # Get text extraction backend for PDF file
+    # - backend of first matching file name pattern (see extraction in config.json) or default backend
+    def get_backend(self, file, name=None):
+        if name is None:
+            name = next((n for pattern, n in params.extraction['files'].items()
+                         if fnmatch(os.path.basename(file), pattern)), params.extraction['backend'])
+        if name not in backends:
+            print("Extraction backend \'{}\' is not available (options: {}).".format(name, ', '.join(backends)))
+            exit(1)
+        if name not in self.backends:
+            self.backends[name] = backends[name](params.extraction.get(name))
+        return self.backends[name]
+
+    # ----------------------------------------
+    # Request text of PDF files ahead of extraction (backends with concurrent clients)
+    # - files: file paths and digests
+    # - files with cached text and identical files are skipped
+    def prefetch(self, files):
+        requests = {}
+        digests = set(self.extracted)
+        for file, digest in files:
+            key = Cache.key(digest, self.get_version(file))
+            if digest not in digests and not (self.cache and self.cache.has(key)):
+                requests.setdefault(self.get_backend(file), []).append(file)
+            digests.add(digest)
+        for backend, backend_files in requests.items():
+            backend.prefetch(backend_files, self.pages['enabled'])
+
+    # ----------------------------------------
+    # Get extraction version of file (backend version included for PDF files)
+    def get_version(self, file):
+        if params.phase != Phases.EXTRACT:
+            return self.version
+        return "{}:{}".format(self.get_backend(file).version(), self.version)
+
+    # ----------------------------------------
+    # Compare text extraction backends on sample of PDF files
+    # - reports extraction time, characters and similarity of cleaned text
+    #   (each backend is compared to the selected backend, see -backend option)
+    def compare(self, files):
+        reference = params.extraction['backend']
+        names = [reference] + [name for name in backends if name != reference]
+        print("Comparing extraction backends ({}) to {} on {} files ...".format(
+            ', '.join(names[1:]) or 'none', reference, len(files)))
+        similarities = {name: [] for name in names[1:]}
+        for file in files:
+            texts = {name: self._clean_up(self.get_backend(file, name).extract(file)["content"] or '')
+                     for name in names}
+            for name in names[1:]:
+                # similarity of words (1.0: identical)
+                similarity = difflib.SequenceMatcher(None, texts[reference].split(), texts[name].split()).ratio()
+                similarities[name].append(similarity)
+                print("{}: {} similarity {:.3f}".format(utils.get_id(file), name, similarity))
+
+        print("\nBackend Comparison Report:")
+        for name in names:
+            n_files, seconds, chars = self.get_backend(None, name).summary()
+            print("{}: {} files, {:.2f}s ({:.2f}s per file), {} characters".format(
+                name, n_files, seconds, seconds / max(n_files, 1), chars))
+        for name, values in similarities.items():
+            if values:
+                print("Mean similarity of cleaned text ({} to {}): {:.3f} (min. {:.3f})".format(
+                    name, reference, sum(values) / len(values), min(values)))
+
+    # ----------------------------------------
+    # Get text of first pages of page-delimited text (full text otherwise)
+    def get_head(self, content):
+        if not self.pages['enabled'] or self.page_separator not in content:
+            return content
+        return self.page_separator.join(content.split(self.page_separator, self.pages['head'])[:self.pages['head']])
 
     # ----------------------------------------
     # Merges raw content with index metadata
@@ -121,8 +239,16 @@ class Extractor:
         get_data = lambda field: index_md[file_id][field] if field in index_md[file_id] else ""
         file_path = os.path.join(params.get_path("articles", "input"), get_data("filename"))
 
+        # index sections of raw text
+        # (front matter of page-delimited text is searched on first pages only)
+        sections = Sections(content)
+        front = Sections(self.get_head(content)) if self.pages['enabled'] else sections
+        # start parse time budget of document
+        budget = params.parse['budget']
+        self.deadline = time.perf_counter() + budget if budget is not None else None
+
         # extract ACM CCS concept metadata from raw text
-        concepts_valid, concepts_invalid = self.ccs(content)
+        concepts_valid, concepts_invalid = self._parse("concepts", ([], []), self.ccs, front.index())
 
         metadata = {
             "id": file_id,
@@ -135,35 +261,53 @@ class Extractor:
             "file_size": utils.get_filesize(file_path),
             "title": get_data("title"),
             "session": get_data("session"),
-            "authors": self.authors(content, index_md[file_id]),
-            "abstract": self.abst(content),
+            "authors": self._parse("authors", None, self.authors, front.header(), index_md[file_id]),
+            "abstract": self._parse("abstract", None, self.abst, front.abstract()),
             "concepts": concepts_valid,
-            "keywords": self.kws(content, concepts_invalid),
-            "categories": self.cats(content),
-            "general_terms": self.gts(content),
+            "keywords": self._parse("keywords", list(concepts_invalid), self.kws, front.keywords(), concepts_invalid),
+            "categories": self._parse("categories", [], self.cats, front.categories()),
+            "general_terms": self._parse("general_terms", [], self.gts, front.general_terms()),
             "url": get_data("url"),
             "page_from": get_data("from"),
             "page_to": get_data("to"),
             "pages": get_data("pages"),
-            "references": self.ref(content),
+            "references": self._parse("references", None, self.ref, sections.references()),
         }
         # self.validate(metadata)
         return metadata
 
+    # ----------------------------------------
+    # Run field handler within parse time budget of document (see merge())
+    # - field: field name (for logs)
+    # - default: field value if handler is aborted
+    # - result of completed handler is kept if time limit is exceeded after it returned
+    def _parse(self, field, default, handler, *args):
+        if self.deadline is None:
+            return handler(*args)
+        done = False
+        try:
+            with utils.time_limit(self.deadline - time.perf_counter()):
+                result = handler(*args)
+                done = True
+        except utils.TimeLimitExceeded:
+            if not done:
+                self.log(field, "Parse time budget exceeded ({}s)".format(params.parse['budget']))
+                return default
+        return result
+
     # ==========================================
     # Field Handlers
     # ==========================================
 
     # Authors
-    # extract title, author names and affiliations from file content
-    def authors(self, content, csv_data):
+    # extract title, author names and affiliations from header text (above abstract)
+    def authors(self, header_raw, csv_data):
         # Process raw PDF extracted data
         # ---------
         # extract raw text of authors + affiliations
-        header_raw = regex.above_abstract.match(content)
         header = []
-        if header_raw:
-            header_raw = header_raw.group(0).strip()
+        if header_raw is not None:
+            header_raw = header_raw.strip()
             # split text into fieldgroups by return and strip of empty tokens
             header = [self._clean_up(x) for x in re.split(r"(\\n|\n|\r)", header_raw) if x != '\n' and len(x) > 0]
         # else:
@@ -199,6 +343,9 @@ class Extractor:
             self.log("authors", "Affiliation CSV data is empty>")
             return
 
+        # index header lines (used to match authors to affiliations)
+        header_index = Header(header)
+
         # Tokenize author names and institution
         # Assumes: [Prefix Firstname Middlename Lastname Suffix]
         for i, person in enumerate(people):
@@ -244,12 +391,10 @@ class Extractor:
                     # -----------------------------------
                     # CASE 1: affiliation below full name
                     # get index of item in header that contains the last name
-                    name_keys = [k for k, v in enumerate(header) if person_data["last_name"] in v]
-                    email_keys = [k for k, v in enumerate(header) if '@' in v]
+                    name_key = header_index.find_name(person_data["last_name"])
 
                     # lastname found in header
-                    if len(name_keys) > 0:
-                        name_key = name_keys[0]
+                    if name_key is not None:
                         # reapply find for comma-delimited list of names
                         extracted_names = header[name_key].split(',')
                         name2_keys = [k for k, v in enumerate(extracted_names) if person_data["last_name"] in v]
@@ -265,12 +410,9 @@ class Extractor:
                         # superscript found
                         if len(superscripts) > 0:
                             # use superscript to find corresponding affiliation
-                            aff_keys = []
-                            for s in superscripts:
-                                aff_keys.extend([k for k, v in enumerate(header) if s in v and k > name_key])
-                            # extract affiliation using last key
-                            if len(aff_keys) > 0:
-                                affiliation = header[aff_keys[-1]]
+                            aff_key = header_index.find_affiliation(superscripts, name_key)
+                            if aff_key is not None:
+                                affiliation = header[aff_key]
 
                             # remove superscripts from name
                             if '@' not in affiliation:
@@ -280,11 +422,11 @@ class Extractor:
                                 affiliation = None
 
                         # select next header item (email addres -> go to next header item)
-                        elif len(header) > name_keys[0] + 1 and '@' not in header[name_keys[0] + 1]:
-                            affiliation = header[name_keys[0] + 1]
+                        elif len(header) > name_key + 1 and not header_index.is_email(name_key + 1):
+                            affiliation = header[name_key + 1]
                         # select second next header item
-                        elif name_keys[0] + 2 < len(header):
-                            affiliation = header[name_keys[0] + 2]
+                        elif name_key + 2 < len(header):
+                            affiliation = header[name_key + 2]
 
                     else:
                         self.log("authors", "Name \'{}\' may not match in documents".format(person_data["last_name"]))
@@ -306,14 +448,12 @@ class Extractor:
         return authors
 
     # ==========================================
-    # extract abstracts from file content
-    def abst(self, content):
-
-        # extract text below abstract heading
-        # OR split content by selection using markers
-        abstract = regex.select_abstract.search(content)
-        if abstract:
-            abstract = abstract.group(2).strip()
+    # extract abstracts from abstract section
+    def abst(self, abstract):
+
+        # text between abstract markers
+        if abstract is not None:
+            abstract = abstract.strip()
             # split by double line breaks (if unlimited)
             # abstract = re.compile(r'([\r\n]{2})').split(abstract)[0]
             # normalize problematic whitespace
@@ -336,51 +476,27 @@ class Extractor:
         return abstract
 
     # ==========================================
-    # extract references from file content
-    def ref(self, content):
+    # extract references from references section (everything after "References")
+    def ref(self, references):
 
         output = []
         i = 1
-        # select everything after "References"
-        references = regex.ref_below.search(content)
-        if references:
-            references = references.group(2)
-            # match and mark reference numbers
-            references = regex.ref_numbers.sub(r"{}\2{}".format(regex.m1, regex.m2), references)
-            # match and mark reference text
-            references = regex.ref_part.sub(r"{}\2\t\4{}\n".format(regex.m1, regex.m2), references)
-            # extract last reference to handle trailing content
-            ref_last = regex.ref_last.search(references)
-            if ref_last is not None:
-                ref_last = ref_last.group(0).replace(regex.m2, "\t")
-            # split references string into reference entries
-            references = regex.ref_split.findall(references)
-            # append last reference to list
-            if ref_last is not None:
-                references.append(ref_last)
-            # else:
-            #     self.log("references", "Last reference lost or invalid")
+        if references is not None:
             # process references
-            for ref in references:
-                # split reference into number and text entry
-                ref = ref.split('\t')
-                # break if two items not extracted from reference string
-                if len(ref) != 2: continue
-                [ref_number, ref_text] = ref
+            for ref_number, ref_text in self._ref_entries(references):
                 # Handle very long references
                 if len(ref_text) > self.max_ref_length:
-                    # insert marker for predicted end of reference
-                    ref_text = regex.ref_truc.sub(r"\1{}\2".format(regex.m1), ref_text)
                     self.log("references", "Truncated very long reference", str(ref_text))
 
                 # reformat hyperlinks
-                hyperlink = regex.hyperlinks.search(ref_text)
+                hyperlink = regex.hyperlinks.search(ref_text) if 'http' in ref_text else None
                 if hyperlink is not None:
                     hyperlink = hyperlink.group()
                     hyperlink = regex.no_hyperlink_ws.sub('', hyperlink)
                     hyperlink = re.sub(r"\s+", "_", hyperlink)
                 # remove newline hyphenation
-                ref_text = regex.no_hyp.sub("", ref_text)
+                if '-' in ref_text:
+                    ref_text = regex.no_hyp.sub("", ref_text)
                 # add back hyperline (if exists)
                 if hyperlink is not None:
                     ref_text = regex.hyperlinks.sub(hyperlink, ref_text)
@@ -404,15 +520,44 @@ class Extractor:
             self.log("references", "References not found")
 
     # ----------------------------------------
-    # extract categories of article
-    def cats(self, content):
+    # Split references section into (reference number, reference text) entries
+    # - scans the reference numbers [n] of the section once
+    # - a number with 1-2 digits at the start of a line starts an entry; the entry text
+    #   ends at the next number in the text (numbers inside an entry are kept as [n])
+    # - last entry ends at the last period at the end of a line, and is dropped if it contains numbers
+    # - entries containing tabs are dropped
+    def _ref_entries(self, references):
+        numbers = list(regex.ref_numbers.finditer(references))
+        starts = [k for k, n in enumerate(numbers) if len(n.group(2)) < 3
+                  and (n.start() == 0 or references[n.start() - 1] == '\n')]
+        for k, start in enumerate(starts):
+            number = numbers[start]
+            # last entry
+            if k == len(starts) - 1:
+                text = references[number.end():]
+                end = len(text) if text.endswith('.') else text.rfind('.\n') + 1
+                if end > 0:
+                    text = text[:end]
+                    inline = start + 1 < len(numbers) and numbers[start + 1].start() < number.end() + end
+                    if not inline and '\t' not in text:
+                        yield number.group(2), text
+                continue
+            # entry text up to next reference number
+            inline = numbers[start + 1]
+            if start + 1 == starts[k + 1]:
+                text = references[number.end():inline.start()]
+            else:
+                text = references[number.end():inline.end()]
+            if '\t' not in text:
+                yield number.group(2), text
+
+    # ----------------------------------------
+    # extract categories of article from categories section
+    def cats(self, rcats):
         categories = []
         cat_node = None
-        rcats = regex.cats.search(content)
         # Categories of form X.0.0
-        if rcats:
-            # replace all whitespace with single space
-            rcats = rcats.group(2)
+        if rcats is not None:
             # remove newline hyphenation
             rcats = regex.no_hyp.sub("", rcats)
             # remove whitespace
@@ -424,23 +569,28 @@ class Extractor:
                 if cat.strip():
                     cat = [c.strip().replace(";", "") for c in cat.split("\t")]
                     cat_desc = None
+                    parent = None
                     if len(cat) == 2:
-                        cat_node = cat[0]
+                        # use category code as listed in taxonomy (e.g. 'h.5.2.' -> 'H.5.2')
+                        cat_node = ccs.find_category(cat[0]) or cat[0]
                         cat_desc = ccs.get_category(cat_node)
+                        parent = ccs.get_parent_category(cat_node)
                     # if verified category found add to categories list
                     if cat_desc:
                         categories.append({"cat_node": cat_node, "descriptor": cat_desc, "type": "S"})
+                    elif parent:
+                        self.log("categories", "Invalid categories extracted (nearest valid category: {})".format(
+                            parent), str(cat))
                     else:
                         self.log("categories", "Invalid categories extracted", str(cat))
         return categories
 
     # ----------------------------------------
-    # extract keywords of article
-    def kws(self, content, concepts_invalid):
+    # extract keywords of article from keywords section
+    def kws(self, r_kws, concepts_invalid):
         kws = []
-        r_kws = regex.kws.search(content)
-        if r_kws:
-            r_kws = r_kws.group(2).strip()
+        if r_kws is not None:
+            r_kws = r_kws.strip()
             # remove newline hyphenation
             r_kws = regex.no_hyp.sub('', r_kws)
             # fix newlines and colon starts
@@ -456,13 +606,11 @@ class Extractor:
         return kws
 
     # ----------------------------------------
-    # extract general terms of article
-    def gts(self, content):
+    # extract general terms of article from general terms section
+    def gts(self, r_getgts):
         gts = []
-        r_getgts = regex.gts.search(content)
 
-        if (r_getgts):
-            r_getgts = r_getgts.group(2)
+        if r_getgts is not None:
             # remove newline hyphenation
             r_getgts = regex.no_hyp.sub("", r_getgts)
             # remove whitespace
@@ -477,15 +625,14 @@ class Extractor:
         return gts
 
     # ----------------------------------------
-    # extract ACM CCS 2012 taxonomies
-    def ccs(self, content):
-        rccs = regex.ccs.search(content)
+    # extract ACM CCS 2012 taxonomies from index section
+    def ccs(self, rccs):
         concepts_valid = []
         concepts_invalid = []
         # Categories of CCS 2012 format
-        if rccs:
+        if rccs is not None:
             # replace all whitespace with single space
-            rccs = regex.ws.sub(" ", rccs.group(2))
+            rccs = regex.ws.sub(" ", rccs)
             # split concept groups
             for concepts_raw in re.split('-; |—; |; |, |\u2022', rccs):
                 concepts_raw = concepts_raw.strip().replace('  ', ' ')
@@ -518,24 +665,9 @@ class Extractor:
                 fp.write(data)
 
     # ----------------------------------------
-    # clean up OCR and common miscellaneous errors/typos
+    # clean up OCR and common miscellaneous errors/typos (see utils.clean_text)
     def _clean_up(self, content):
-        clean_text = regex.ws_top.sub("", content)
-        clean_text = regex.dq.sub("&#34;", clean_text)
-        clean_text = regex.sq.sub("&#39;", clean_text)
-        # OCR: Replace LATIN SMALL LIGATURE FI with "fi"
-        clean_text = regex.fi.sub("fi", clean_text)
-        # OCR: Replace LATIN SMALL LIGATURE FL with "fl"
-        clean_text = regex.fl.sub("fl", clean_text)
-        clean_text = regex.dingbats1.sub("", clean_text)
-        clean_text = regex.dingbats2.sub("", clean_text)
-        # handle composing characters
-        # Return the normal ‘NFKC’ form for the Unicode string
-        # The normal form KC (NFKC) first applies the compatibility
-        # decomposition, followed by the canonical composition.
-        clean_text = ud.normalize("NFKC", clean_text)
-
-        return clean_text
+        return utils.clean_text(content)
 
     # ----------------------------------------
     # validate metadata
@@ -556,6 +688,9 @@ class Extractor:
         txt_file = os.path.join(params.get_path("txt", "output"), md["id"] + ".txt")
         # count number of logged issues
         issues = [log for log in self.logger.values() if (len(log) > 0)]
+        for field, log in self.logger.items():
+            for message in log:
+                events.emit('issue', id=md["id"], field=field, message=message)
         # Issues logged -> create log and patch files
         if len(issues) > 0:
             # save copy of metadata as patch if none exists
@@ -564,10 +699,15 @@ class Extractor:
             # save extracted content as raw text patch if none exists
             if not os.path.isfile(txt_file):
                 self.save(content, txt_file)
-            # save copy as log
-            self.save(self.logger, log_file)
+            # save copy as log (metadata store and/or file)
+            if store:
+                store.put('logs', md["id"], self.logger)
+            if not store or params.store['export']:
+                self.save(self.logger, log_file)
         else:
             # delete log file
+            if store:
+                store.delete('logs', md["id"])
             if os.path.isfile(log_file):
                 os.remove(log_file)
         # reset logger
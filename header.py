@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Header Index
+===========================================
+Indexes the header lines of the article text (title, authors, affiliations)
+once, so author names can be matched to affiliations by lookups instead of
+scanning every line for each author and superscript.
+"""
+
+from bisect import bisect_right
+from regex import regex
+
+
+class Header:
+
+    def __init__(self, lines):
+        self.lines = lines
+        # header text (lines joined by newlines) and offsets of lines in text
+        # (lines contain no newline, so a match of a name without newline does not cross lines)
+        self.text = '\n'.join(lines)
+        self.offsets = []
+        offset = 0
+        for line in lines:
+            self.offsets.append(offset)
+            offset += len(line) + 1
+        # line numbers indexed by superscript character (non-alphabetic, non-ASCII punctuation)
+        self.superscripts = {}
+        # line numbers of email addresses
+        self.emails = set()
+        for k, line in enumerate(lines):
+            for s in set(line):
+                if not s.isalpha() and s not in regex.nonalpha_ascii:
+                    self.superscripts.setdefault(s, []).append(k)
+            if '@' in line:
+                self.emails.add(k)
+
+    # ----------------------------------------
+    # first line containing name (None if not found)
+    def find_name(self, name):
+        if not self.lines:
+            return None
+        idx = self.text.find(name)
+        if idx < 0:
+            return None
+        return bisect_right(self.offsets, idx) - 1
+
+    # ----------------------------------------
+    # affiliation line of superscripts below name line (None if not found)
+    # - last line below name line containing the last matched superscript
+    def find_affiliation(self, superscripts, name_key):
+        for s in reversed(superscripts):
+            keys = self.superscripts.get(s)
+            if keys and keys[-1] > name_key:
+                return keys[-1]
+        return None
+
+    # ----------------------------------------
+    # check if line contains email address
+    def is_email(self, k):
+        return k in self.emails
@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
 import os
+import time
 from copy import deepcopy
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
 from shutil import copyfile
 
 import params
 import utils
 from tqdm import tqdm
 from extractor import extractor
+from backends import ExtractionError
+from categories import ccs
 from params import params, Phases, Schema
 from builder import builder
+from manifest import manifest
+from events import events
+from store import store
 
 """
 Metadata Processor
@@ -17,10 +25,150 @@ Converts PDF documents to XML metadata
  * Applies ACM DL XML Schema
  * Dependencies:
    - lxml XML toolkit
-   - Tika (Apache)
+   - Tika (Apache) or pypdf (see backends)
    
 """
 
+# article index metadata (per worker process)
+worker_md = None
+
+
+# ----------------------------------------
+# Extract metadata for a single article
+# ----------------------------------------
+# - file: PDF or raw text filepath
+# - articles_md: extracted CSV index metadata
+# - digest: digest of file (see utils.get_digest)
+# - returns number of issues logged
+# ----------------------------------------
+def extract_article(file, articles_md, digest=None):
+    start = time.perf_counter()
+    # get reference ID from CSV filename
+    file_id = utils.get_id(file)
+    # extract raw text from PDF file or use existing raw text
+    content = extractor.pdf(file, digest) if params.phase == Phases.EXTRACT else extractor.txt(file)
+    data = extractor.merge(file_id, articles_md, content)
+
+    # save processed metadata (metadata store and/or file)
+    if store:
+        store.put('articles', file_id, data)
+    if not store or params.store['export']:
+        extractor.save(data, os.path.join(params.get_path("articles", "metadata"), file_id + ".json"))
+    issues = extractor.generate_patch(data, content)
+    events.emit('article', id=file_id, phase=params.phase.name, issues=issues,
+                seconds=round(time.perf_counter() - start, 3))
+    return issues
+
+
+# ----------------------------------------
+# initialize worker process with article index metadata
+def init_worker(articles_md):
+    global worker_md
+    worker_md = articles_md
+    # save concept lookups when worker exits
+    Finalize(ccs, ccs.save_memo, exitpriority=10)
+
+
+# ----------------------------------------
+# extract article in worker process
+# - task: file path and digest
+def extract_worker(task):
+    file, digest = task
+    try:
+        return extract_article(file, worker_md, digest)
+    except SystemExit:
+        # extractor aborted: report to parent process instead of losing the worker
+        raise RuntimeError("Extraction aborted for file {}.".format(file))
+
+
+# ----------------------------------------
+# Build article XML, validate and save output
+# ----------------------------------------
+# - task: article ID, article metadata, XSLT path, output file, raw XML file, input digest,
+#   selected for validation, digest of last valid output (see validation policy in config.json)
+# - returns validation result, last error and digest of validated output
+# ----------------------------------------
+def build_article(task):
+    article_id, md_article, xslt_path, article_file, xml_file, digest, selected, validated = task
+    start = time.perf_counter()
+    events.log("\n\nGenerating article {} ... ".format(article_id))
+    # convert article metadata to XML (generic tree is built once for transform and raw output)
+    # - native emitters write schematized XML directly (no generic tree)
+    if builder.emitter:
+        xml_data = None
+        xml_article = builder.emitter.emit(md_article)
+    else:
+        xml_data = builder.build(md_article)
+        xml_article = builder.transform(xml_data, xslt_path)
+    # Remove empty tags
+    xml_article = builder.remove_empty(xml_article)
+    # validate against schema (see validation policy)
+    result = builder.check(xml_article, selected, validated)
+    # save article output
+    utils.save(xml_article, article_file)
+    # save raw xml generated
+    if xml_data is not None:
+        utils.save(xml_data, xml_file)
+    events.emit('built', id=article_id, schema=params.schema.name, valid=result[0], error=result[1],
+                seconds=round(time.perf_counter() - start, 3))
+    return result
+
+
+# ----------------------------------------
+# Build articles (in worker processes, see -jobs) and report validation results
+# - tasks: article ID, article metadata, XSLT path, output file, raw XML file, input digest
+# - stage: build manifest stage
+def build_articles(tasks, stage):
+    # select articles for validation (sample policy: evenly spaced sample) and get last valid outputs
+    sample = range(len(tasks))
+    if builder.policy == 'sample':
+        step = max(len(tasks) / builder.sample, 1)
+        sample = {int(k * step) for k in range(min(builder.sample, len(tasks)))}
+    tasks = [task + (k in sample, (manifest.get(stage, task[0]) or {}).get('validated'))
+             for k, task in enumerate(tasks)]
+    if params.jobs > 1 and len(tasks) > 1:
+        # compile stylesheets and schema before worker processes are forked
+        # (changed-only policy: schema is compiled if an article has no validated output yet;
+        #  otherwise workers compile it only if an output changed)
+        if not builder.emitter:
+            for xslt_path in set(task[2] for task in tasks):
+                builder.get_xslt(xslt_path)
+        if builder.policy in ('all', 'sample') \
+                or builder.policy == 'changed-only' and any(task[7] is None for task in tasks):
+            builder.get_schema()
+        with Pool(params.jobs) as pool:
+            results = list(tqdm(pool.imap(build_article, tasks), total=len(tasks), desc="Build:",
+                                disable=events.quiet))
+    else:
+        results = [build_article(task) for task in tqdm(tasks, desc="Build:", disable=events.quiet)]
+
+    # record inputs of valid and not validated articles (invalid articles are rebuilt on the next run)
+    # (invalid articles are always listed)
+    print("\n\nXSD Validation Report:")
+    n_invalid = 0
+    n_unchecked = 0
+    for task, (valid, error, validated) in zip(tasks, results):
+        if valid is False:
+            n_invalid += 1
+            print("{}: NOT VALID".format(task[0]))
+            print("\t{}".format(error))
+            continue
+        if valid is None:
+            n_unchecked += 1
+        events.log("{}: {}".format(task[0], 'VALID' if valid else 'NOT VALIDATED'))
+        manifest.update(stage, task[0], task[5], validated=validated)
+    print("Articles built: {}, not valid: {}, not validated: {}".format(len(tasks), n_invalid, n_unchecked))
+    manifest.save()
+
+
+# ----------------------------------------
+# Check if inputs and outputs of article are unchanged (see build manifest)
+# - articles not validated before are rebuilt if all articles are validated (see validation policy)
+def unchanged(stage, ref_id, digest, *outputs):
+    if not manifest.unchanged(stage, ref_id, digest, *outputs):
+        return False
+    return builder.policy != 'all' or manifest.get(stage, ref_id).get('validated') is not None
+
 
 def main():
     # EXTRACTION or UPDATE phases
@@ -32,39 +180,97 @@ def main():
         else:
             input_source = params.get_files("txt", "output")
 
+        # compare extraction backends on evenly spaced sample of PDF files (no output is generated)
+        if params.phase == Phases.EXTRACT and params.compare:
+            step = max(len(input_source) / params.compare, 1)
+            extractor.compare([input_source[int(k * step)] for k in range(min(params.compare, len(input_source)))])
+            return
+
         # extract metadata from articles index CSV
         articles_md = extractor.csv(params.get_path("index", "input"), "id")
 
-        # extract metadata from PDF articles (Tika) / Raw text
+        # import existing article metadata files missing from metadata store (see Store.import_articles)
+        if store:
+            store.import_articles(params.get_path('articles', 'metadata'))
+
+        # skip articles with unchanged inputs (see build manifest)
         issues = 0
-        for file in tqdm(input_source, desc="Data {}:".format(params.phase.name)):
-            # get reference ID from CSV filename
+        pending = []
+        taxonomy_version = [utils.get_digest(f) for f in params.paths['taxonomy'].values()]
+        for file in input_source:
             file_id = utils.get_id(file)
-            # extract raw text from PDF file or use existing raw text
-            content = extractor.pdf(file) if params.phase == Phases.EXTRACT else extractor.txt(file)
-            data = extractor.merge(file_id, articles_md, content)
+            # (file is hashed once, see extract_article())
+            file_digest = utils.get_digest(file)
+            digest = manifest.digest(params.phase.name, file_digest, articles_md.get(file_id),
+                                     taxonomy_version, extractor.get_version(file))
+            # output: stored article metadata (metadata store) or JSON file
+            output = os.path.join(params.get_path("articles", "metadata"), file_id + ".json")
+            stored = store.has('articles', file_id) if store else os.path.isfile(output)
+            if not params.force and stored and manifest.unchanged('articles', file_id, digest):
+                issues += manifest.get('articles', file_id)['issues']
+                events.emit('skipped', id=file_id, phase=params.phase.name)
+            else:
+                pending.append((file, file_digest, digest))
+        if len(pending) < len(input_source):
+            events.log("Skipping {} unchanged articles.".format(len(input_source) - len(pending)), events.INFO)
 
-            # save processed metadata to file
-            extractor.save(data, os.path.join(params.get_path("articles", "metadata"), file_id + ".json"))
-            issues += extractor.generate_patch(data, content)
+        # extract metadata from PDF articles (Tika) / Raw text
+        desc = "Data {}:".format(params.phase.name)
+        files = [(file, file_digest) for file, file_digest, digest in pending]
+        if params.jobs > 1:
+            # distribute articles to worker processes (order of results is preserved)
+            with Pool(params.jobs, initializer=init_worker, initargs=(articles_md,)) as pool:
+                try:
+                    results = list(tqdm(pool.imap(extract_worker, files), total=len(files), desc=desc,
+                                        disable=events.quiet))
+                except (RuntimeError, ExtractionError) as e:
+                    print("Error: {}".format(e))
+                    exit(1)
+                # let workers exit normally (see init_worker)
+                pool.close()
+                pool.join()
+        else:
+            # request PDF text concurrently while articles are processed (see extraction in config.json)
+            if params.phase == Phases.EXTRACT:
+                extractor.prefetch(files)
+            try:
+                results = [extract_article(file, articles_md, file_digest)
+                           for file, file_digest in tqdm(files, desc=desc, disable=events.quiet)]
+            except ExtractionError as e:
+                print("Error: {}".format(e))
+                exit(1)
+            ccs.save_memo()
+
+        # record inputs of extracted articles
+        for (file, file_digest, digest), n_issues in zip(pending, results):
+            manifest.update('articles', utils.get_id(file), digest, issues=n_issues)
+            issues += n_issues
+        manifest.save()
 
         print('\nParsing errors/issues found: {}'.format(issues))
+        events.emit('finished', phase=params.phase.name, articles=len(input_source), extracted=len(pending),
+                    issues=issues)
 
     # BUILD phase
 
     elif params.phase == Phases.BUILD or params.phase == Phases.PATCH:
 
-        # get article metadata
-        article_files = params.get_files('articles', 'metadata')
+        # get article metadata with patches applied
+        # (metadata store: missing article files are imported, patch files are synchronized)
+        if store:
+            store.import_articles(params.get_path('articles', 'metadata'))
+            store.sync_patches(params.get_path('patches', 'output'))
+            md_articles = store.get_articles()
+        else:
+            md_articles = utils.load_articles(params.get_files('articles', 'metadata'),
+                                              params.get_path('patches', 'output'))
 
         # collate metadata from extractor
-        md_base = utils.collate(
-            params.get_path('base', 'metadata'),
-            article_files,
-            params.get_path('patches', 'output')
-        )
+        md_base = utils.collate(params.get_path('base', 'metadata'), md_articles)
 
-        utils.save(builder.build(md_base), os.path.join(params.get_path("build", "output"), "wordpress_import.xml"))
+        # generic XML tree of base metadata (shared by WordPress import, manifest and base XML)
+        xml_md_base = builder.build(md_base)
+        utils.save(xml_md_base, os.path.join(params.get_path("build", "output"), "wordpress_import.xml"))
 
         # Apply ACM schema (BITS format)
         if params.schema == Schema.BITS:
@@ -78,17 +284,23 @@ def main():
             # create root directory
             utils.mk_dir(output_path, root_dir)
             # create manifest
-            print("\n\nGenerating manifest ... ")
-            xml_manifest = builder.transform(builder.build(md_base), params.paths['templates']['manifest'])
+            events.log("\n\nGenerating manifest ... ", events.INFO)
+            xml_manifest = builder.transform(xml_md_base, params.paths['templates']['manifest'])
             utils.save(xml_manifest, os.path.join(output_path, root_dir, "manifest.xml"))
             # build base XML from metadata and apply XSLT
-            print("\n\nGenerating base XML ... ")
+            events.log("\n\nGenerating base XML ... ", events.INFO)
             utils.mk_dir(output_path, root_dir, base_dir)
             utils.mk_dir(output_path, root_dir, base_dir, base_dir)
-            xml_base = builder.transform(builder.build(md_base), params.paths['templates']['base'])
+            xml_base = builder.transform(xml_md_base, params.paths['templates']['base'])
             # Remove empty tags
             xml_base = builder.remove_empty(xml_base)
-            builder.validate(xml_base)
+            # validate (digest of last valid base XML is recorded, see validation policy)
+            # (invalid base XML is validated again on the next run)
+            record = manifest.get('base', base_id) or {}
+            valid, error, validated = builder.check(xml_base, validated=record.get('validated'))
+            if valid is not False:
+                digest = manifest.digest(md_base, builder.get_template_version(params.paths['templates']['base']))
+                manifest.update('base', base_id, digest, validated=validated)
             utils.save(xml_base, os.path.join(output_path, root_dir, base_dir, base_dir, base_id + ".xml"))
             # Copy front-matter (if provided) to base directory
             fm_src_path = params.get_path("front-matter", "input")
@@ -97,31 +309,31 @@ def main():
                 fm_dst_path = os.path.join(output_path, root_dir, base_dir, base_dir, fm_filename)
                 copyfile(fm_src_path, fm_dst_path)
             # Generate article xml documents and validate
+            template = params.paths['templates']['article']
+            template_version = builder.get_template_version(template)
+            tasks = []
             for md_session in md_base['sessions']:
                 if 'articles' in md_session:
                     for md_article in md_session['articles']:
-                        print("\n\nGenerating article {} ... ".format(md_article['doi']))
                         article_doi = "{}.{}".format(base_id, md_article['doi'])
-                        # create article directory
-                        utils.mk_dir(output_path, root_dir, base_dir, article_doi)
+                        article_file = os.path.join(output_path, root_dir, base_dir, article_doi, article_doi + ".xml")
+                        xml_file = os.path.join(params.get_path("xml", "output"), article_doi + ".xml")
                         # attach base metadata fields to metadata
                         md_article['conference'] = md_base['conference']
                         md_article['publication'] = md_base['publication']
-                        # convert article metadata to XML
-                        xml_article = builder.transform(builder.build(md_article), params.paths['templates']['article'])
-                        # Remove empty tags
-                        xml_article = builder.remove_empty(xml_article)
-                        # validate against schema
-                        builder.validate(xml_article)
-                        # save article output
-                        utils.save(xml_article,
-                                   os.path.join(output_path, root_dir, base_dir, article_doi, article_doi + ".xml"))
-                        # save raw xml generated
-                        utils.save(builder.build(md_article),
-                                   os.path.join(params.get_path("xml", "output"), article_doi + ".xml"))
+                        # skip articles with unchanged metadata and template (see build manifest)
+                        digest = manifest.digest(md_article, template_version)
+                        if not params.force and unchanged('bits', article_doi, digest, article_file, xml_file):
+                            events.log("\n\nArticle {} is unchanged.".format(md_article['doi']))
+                            events.emit('skipped', id=article_doi, schema=params.schema.name)
+                            continue
+                        # create article directory
+                        utils.mk_dir(output_path, root_dir, base_dir, article_doi)
+                        tasks.append((article_doi, md_article, template, article_file, xml_file, digest))
                         # DEBUG: create intermediate XML metadata file
                         # xml_external = builder.transform(builder.build(md_base), params.paths.templates.external))
                         # utils.save(xml_external, os.path.join(params.get_path("output"), root_dir, article_doi + ".xml"))
+            build_articles(tasks, 'bits')
 
         # Apply DataCite schema
         elif params.schema == Schema.DATACITE:
@@ -129,30 +341,39 @@ def main():
             base_id = md_base['conference']['series'].replace(' ', '_')
             root_dir = "datacite_{}_{}".format(base_id, params.datestamp)
             output_path = params.get_path("build", "output")
-            patches_path = params.get_path('patches', 'output')
             # create root directory
             utils.mk_dir(output_path, root_dir)
             # Generate article xml documents and validate
-            for md_article_file in params.get_files('articles', 'metadata'):
-                # Apply patch (if exists)
-                md_article = utils.apply_patch(md_article_file, patches_path)
+            template = params.paths['templates']['datacite']
+            template_version = [builder.emitter.version] if builder.emitter else builder.get_template_version(template)
+            tasks = []
+            articles = []
+            for md_article in md_articles:
                 article_id = md_article['id']
-                print("\n\nGenerating article {} ... ".format(article_id))
+                article_file = os.path.join(output_path, root_dir, article_id + ".xml")
+                xml_file = os.path.join(params.get_path("xml", "output"), article_id + ".xml")
                 # attach base metadata fields to metadata
                 md_article['conference'] = md_base['conference']
                 md_article['publication'] = md_base['publication']
                 md_article['publisher'] = md_base['publisher']
-                # convert article metadata to XML
-                xml_article = builder.transform(builder.build(md_article), params.paths['templates']['datacite'])
-                # Remove empty tags
-                xml_article = builder.remove_empty(xml_article)
-                # validate against schema
-                builder.validate(xml_article)
-                # save article output
-                utils.save(xml_article, os.path.join(output_path, root_dir, article_id + ".xml"))
-                # save raw xml generated
-                utils.save(builder.build(md_article),
-                           os.path.join(params.get_path("xml", "output"), article_id + ".xml"))
+                # compare native emitter and XSLT template (see -compare-emitters option)
+                if params.compare_emitters:
+                    articles.append((article_id, md_article))
+                    continue
+                # skip articles with unchanged metadata and template (see build manifest)
+                digest = manifest.digest(md_article, template_version)
+                outputs = [article_file] if builder.emitter else [article_file, xml_file]
+                if not params.force and unchanged('datacite', article_id, digest, *outputs):
+                    events.log("\n\nArticle {} is unchanged.".format(article_id))
+                    events.emit('skipped', id=article_id, schema=params.schema.name)
+                    continue
+                tasks.append((article_id, md_article, template, article_file, xml_file, digest))
+            if params.compare_emitters:
+                step = max(len(articles) / params.compare_emitters, 1)
+                builder.compare([articles[int(k * step)]
+                                 for k in range(min(params.compare_emitters, len(articles)))], template)
+                return
+            build_articles(tasks, 'datacite')
 
         # Apply WordPress RSS schema
         elif params.schema == Schema.WORDPRESS:
@@ -189,16 +410,17 @@ def main():
                     md_base_indexed['sessions'][j]['articles'][k]['wp_post_name'] = article_id
 
             # convert json metadata -> xml
-            print("\n\nGenerating WordPress XML ... ")
+            events.log("\n\nGenerating WordPress XML ... ", events.INFO)
             if not 'wordpress' in params.paths['templates']:
                 print('Wordpress template is missing.')
                 exit(1)
-            xml_base = builder.transform(builder.build(md_base_indexed), params.paths['templates']['wordpress'])
+            xml_md_base_indexed = builder.build(md_base_indexed)
+            xml_base = builder.transform(xml_md_base_indexed, params.paths['templates']['wordpress'])
             # Remove empty tags
             xml_base = builder.remove_empty(xml_base)
-            utils.save(builder.build(md_base_indexed), '/Users/boutrous/Workspace/Metadata/GI/2020/build/test.xml')
+            utils.save(xml_md_base_indexed, '/Users/boutrous/Workspace/Metadata/GI/2020/build/test.xml')
 
-            builder.validate(xml_base)
+            builder.check(xml_base)
             utils.save(xml_base, os.path.join(output_path, output_id, output_id + ".xml"))
 
         else:
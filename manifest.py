@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Build Manifest
+===========================================
+Records digests of the inputs used to generate each article output
+ * Articles with unchanged inputs are skipped by extract, update and build
+"""
+
+import os
+import json
+import hashlib
+from params import params
+
+
+class Manifest:
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if os.path.isfile(self.path):
+            with open(self.path, encoding='utf-8') as fp:
+                try:
+                    self.records = json.load(fp)
+                except ValueError:
+                    print('Manifest {} is invalid and will be regenerated.'.format(self.path))
+
+    # ----------------------------------------
+    # combined digest of input values (JSON-serializable)
+    @staticmethod
+    def digest(*values):
+        sha = hashlib.sha256()
+        for value in values:
+            sha.update(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return sha.hexdigest()
+
+    # ----------------------------------------
+    # get record of article output for stage
+    def get(self, stage, ref_id):
+        return self.records.get(stage, {}).get(ref_id)
+
+    # ----------------------------------------
+    # check if inputs of article output are unchanged
+    def unchanged(self, stage, ref_id, digest, *outputs):
+        record = self.get(stage, ref_id)
+        return record is not None and record['digest'] == digest and all(os.path.isfile(f) for f in outputs)
+
+    # ----------------------------------------
+    # record inputs of article output for stage
+    def update(self, stage, ref_id, digest, **data):
+        self.records.setdefault(stage, {})[ref_id] = dict(data, digest=digest)
+
+    # ----------------------------------------
+    # save manifest to file
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fp:
+            json.dump(self.records, fp, ensure_ascii=False, indent=4)
+        os.replace(tmp, self.path)
+
+
+# instantiate manifest
+manifest = Manifest(os.path.join(params.paths['root'], params.manifest['path']))
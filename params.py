@@ -10,9 +10,8 @@ import json
 import sys
 import datetime
 import utils
+from events import events
 from enum import Enum
-import lxml.etree as et
-from pathlib import Path
 
 
 # Phase enumeration constants
@@ -45,13 +44,42 @@ class Parameters:
         self.schema = None
         self.empty_nodes = ['self-uri']
         self.element_name = 'element'
+        # number of worker processes (see -jobs option)
+        self.jobs = 1
+        # regenerate all outputs (see -force option)
+        self.force = False
+        # number of PDF files to compare extraction backends on (see -compare option)
+        self.compare = 0
+        # number of articles to compare native emitter and XSLT template on (see -compare-emitters option)
+        self.compare_emitters = 0
+        # console verbosity (see -quiet, -verbose and -debug options)
+        self.verbosity = events.INFO
 
         # load configuration data
         with open('config.json') as fp:
             cf = json.load(fp)
             self.paths = cf['paths']
-            self.skos = et.parse(os.path.join(Path(__file__).parent, cf['paths']['taxonomy']['CCS2012'])).getroot()
             self.csv = cf['csv']
+            # extraction cache settings (path relative to root; max. size in MB)
+            self.cache = cf['cache']
+            # memoized concept lookups (path relative to root)
+            self.concepts = cf['concepts']
+            # text extraction backend (default and by file name pattern)
+            self.extraction = cf['extraction']
+            # page-delimited extraction settings (first/last pages kept)
+            self.pages = cf['pages']
+            # parse time budget per document [s] (null: no limit)
+            self.parse = cf['parse']
+            # XML emitter by schema (xslt: XSLT template; native: see emitters.py, raw generic XML is not saved)
+            self.emitters = cf['emitters']
+            # validation policy of built articles (all, sample:N, changed-only or none)
+            self.validation = cf['validation']
+            # consolidated metadata store (path relative to root; export: also save JSON files)
+            self.store = cf['store']
+            # build manifest settings (path relative to root)
+            self.manifest = cf['manifest']
+            # compiled taxonomy snapshot settings
+            self.snapshot = cf['snapshot']
         try:
 
             # --------- parse command line input ---------
@@ -106,6 +134,44 @@ class Parameters:
                 else:
                     print("Processing phase requested is not valid.")
                     exit(1)
+
+                # --------- optional flags ---------
+                # number of worker processes
+                self.jobs = self.get_option('-jobs', 1)
+                if self.jobs < 1:
+                    print("Number of jobs must be at least 1.")
+                    exit(1)
+                # ignore build manifest and regenerate all outputs
+                self.force = '-force' in sys.argv
+                # text extraction backend for this run
+                self.extraction['backend'] = self.get_option('-backend', self.extraction['backend'])
+                # compare extraction backends on sample of PDF files
+                self.compare = self.get_option('-compare', 0)
+                # compare native emitter and XSLT template on sample of articles
+                self.compare_emitters = self.get_option('-compare-emitters', 0)
+                # console verbosity and event stream (JSON lines)
+                if '-quiet' in sys.argv:
+                    self.verbosity = events.QUIET
+                elif '-debug' in sys.argv:
+                    self.verbosity = events.DEBUG
+                elif '-verbose' in sys.argv:
+                    self.verbosity = events.VERBOSE
+                target = self.get_option('-events')
+                if target is not None and target.startswith('fd:') and not target[3:].isdigit():
+                    print("Invalid value {} for option -events (file path or fd:N).".format(target))
+                    exit(1)
+                try:
+                    events.configure(self.verbosity, target)
+                except OSError as e:
+                    print("Event stream {} could not be opened: {}".format(target, e))
+                    exit(1)
+                # validation policy for this run
+                self.validation['policy'] = self.get_option('-validate', self.validation['policy'])
+                policy, _, sample = self.validation['policy'].partition(':')
+                if policy not in ('all', 'changed-only', 'none', 'sample') \
+                        or (policy == 'sample') != (sample.isdecimal() and int(sample) >= 1):
+                    print("Validation policy must be all, sample:N, changed-only or none.")
+                    exit(1)
             else:
                 print("Missing arguments.")
                 exit(1)
@@ -114,6 +180,22 @@ class Parameters:
             print(err)
             exit(1)
 
+    # --------------------------------------
+    # Get value of optional command line flag (e.g. -jobs 4)
+    def get_option(self, flag, default=None):
+        if flag not in sys.argv:
+            return default
+        idx = sys.argv.index(flag)
+        if idx + 1 >= len(sys.argv):
+            print("Missing value for option {}.".format(flag))
+            exit(1)
+        value = sys.argv[idx + 1]
+        try:
+            return type(default)(value) if default is not None else value
+        except ValueError:
+            print("Invalid value {} for option {}.".format(value, flag))
+            exit(1)
+
     # --------------------------------------
     # Get file or directory path
     def get_path(self, sub_dir, parent_dir=None):
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Section Segmenter
+===========================================
+Indexes section markers (======name-start/end======) and heading anchors
+of the article text in a single pass. Field handlers select their section
+from the index instead of scanning the full text.
+"""
+
+from regex import regex
+
+
+class Sections:
+
+    def __init__(self, content):
+        self.content = content
+        # section markers indexed by name and position (start/end)
+        # - start: offset of marker line (including leading whitespace)
+        # - body: offset after marker (including trailing newline)
+        # - ws: length of leading whitespace
+        # - nl: length of trailing newline
+        self.markers = {}
+        # heading anchors indexed by heading: offsets (start, end, start of heading word)
+        # (start includes section numbering, e.g. "1 Keywords")
+        self.anchors = {'abstract': [], 'categories': [], 'general_terms': [], 'introduction': [], 'keywords': []}
+
+        for m in regex.sections.finditer(content):
+            heading = m.lastgroup
+            if heading == 'marker':
+                name = m.group('name').lower()
+                # marker names are also heading anchors
+                if name in ('introduction', 'keywords'):
+                    self.anchors[name].append((m.start('name'), m.end('name'), m.start('name')))
+                # markers start a line (optionally indented by one whitespace character)
+                start = self._line_start(m.start())
+                if start is not None:
+                    self.markers.setdefault(name, {'start': [], 'end': []})[m.group('pos').lower()].append({
+                        'start': start,
+                        'body': m.end(),
+                        'ws': m.start() - start,
+                        'nl': len(m.group('nl'))})
+            elif heading == 'keywords':
+                self.anchors[heading].append((m.start(), m.end(), m.start('kw')))
+            else:
+                self.anchors[heading].append((m.start(), m.end(), m.start()))
+
+    # ----------------------------------------
+    # start of line containing marker at offset (None if marker is not at line start)
+    def _line_start(self, offset):
+        # leading whitespace character
+        if offset > 0 and self.content[offset - 1].isspace() and (offset == 1 or self.content[offset - 2] == '\n'):
+            return offset - 1
+        if offset == 0 or self.content[offset - 1] == '\n':
+            return offset
+        return None
+
+    # ----------------------------------------
+    # get markers of section
+    def _get_markers(self, name, pos):
+        return self.markers[name][pos] if name in self.markers else []
+
+    # ----------------------------------------
+    # text above abstract heading (title, authors, affiliations)
+    def header(self):
+        if self.anchors['abstract']:
+            return self.content[:self.anchors['abstract'][0][0]]
+
+    # ----------------------------------------
+    # text between abstract markers
+    def abstract(self):
+        for start in self._get_markers('abstract', 'start'):
+            if not start['nl']:
+                continue
+            for end in self._get_markers('abstract', 'end'):
+                if end['start'] >= start['body'] and end['ws'] == 1 and end['nl']:
+                    return self.content[start['body']:end['start']]
+
+    # ----------------------------------------
+    # text between CCS index markers
+    def index(self):
+        for start in self._get_markers('index', 'start'):
+            for end in self._get_markers('index', 'end'):
+                body = start['body'] - start['nl']
+                if end['start'] >= body and end['ws'] == 1:
+                    return self.content[body:end['start']]
+
+    # ----------------------------------------
+    # text between first keywords start marker and last keywords end marker
+    def keywords(self):
+        starts = self._get_markers('keywords', 'start')
+        ends = [end for end in self._get_markers('keywords', 'end') if end['nl']]
+        if starts and ends and ends[-1]['start'] >= starts[0]['body']:
+            return self.content[starts[0]['body']:ends[-1]['start']]
+
+    # ----------------------------------------
+    # text below references start marker
+    def references(self):
+        starts = self._get_markers('references', 'start')
+        if starts:
+            return self.content[starts[0]['body']:]
+
+    # ----------------------------------------
+    # text between categories heading and next introduction/keywords heading
+    def categories(self):
+        if self.anchors['categories']:
+            start = self.anchors['categories'][0][1]
+            ends = [a[0] for a in self.anchors['introduction'] + self.anchors['keywords'] if a[0] >= start]
+            if ends:
+                return self.content[start:min(ends)]
+
+    # ----------------------------------------
+    # text between general terms heading and last keywords heading
+    def general_terms(self):
+        if self.anchors['general_terms'] and self.anchors['keywords']:
+            start = self.anchors['general_terms'][0][1]
+            end = self.anchors['keywords'][-1][2]
+            if end >= start:
+                return self.content[start:end]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+===========================================
+Metadata Store
+===========================================
+Consolidated SQLite store of article metadata, patches and extraction logs
+ * Replaces the per-article JSON files as source of truth (see store in config.json)
+ * Patch files are imported from the patches directory when they change
+ * Article metadata and logs can still be exported as JSON files
+"""
+
+import os
+import json
+import sqlite3
+import utils
+from params import params
+from events import events
+
+
+class Store:
+
+    tables = ('articles', 'patches', 'logs')
+
+    def __init__(self, path):
+        self.path = path
+        # connection of current process (worker processes open their own connection)
+        self.db = None
+        self.pid = None
+
+    # ----------------------------------------
+    # get database connection of current process (tables are created if needed)
+    def connect(self):
+        if self.db is None or self.pid != os.getpid():
+            self.db = sqlite3.connect(self.path, timeout=60)
+            self.pid = os.getpid()
+            # concurrent readers and one writer (extraction workers)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            with self.db:
+                for table in self.tables:
+                    self.db.execute('CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                                    'mtime INTEGER, size INTEGER)'.format(table))
+        return self.db
+
+    # ----------------------------------------
+    # store record (replaces existing record)
+    # - mtime, size: modification time and size of source file (patches)
+    def put(self, table, ref_id, data, mtime=None, size=None):
+        with self.connect() as db:
+            db.execute('INSERT OR REPLACE INTO {} (id, data, mtime, size) VALUES (?, ?, ?, ?)'.format(table),
+                       (ref_id, json.dumps(data, ensure_ascii=False), mtime, size))
+
+    # ----------------------------------------
+    # get record (None if not found)
+    def get(self, table, ref_id):
+        row = self.connect().execute('SELECT data FROM {} WHERE id = ?'.format(table), (ref_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ----------------------------------------
+    # check if record exists
+    def has(self, table, ref_id):
+        row = self.connect().execute('SELECT 1 FROM {} WHERE id = ?'.format(table), (ref_id,)).fetchone()
+        return row is not None
+
+    # ----------------------------------------
+    # delete record (if exists)
+    def delete(self, table, ref_id):
+        with self.connect() as db:
+            db.execute('DELETE FROM {} WHERE id = ?'.format(table), (ref_id,))
+
+    # ----------------------------------------
+    # import article metadata files of articles directory missing from store
+    # - stored articles are kept (store is source of truth)
+    def import_articles(self, articles_path):
+        files = {}
+        if articles_path and os.path.isdir(articles_path):
+            for entry in os.scandir(articles_path):
+                if entry.is_file() and entry.name.endswith('.json'):
+                    files[os.path.splitext(entry.name)[0]] = entry.path
+        stored = {ref_id for ref_id, in self.connect().execute('SELECT id FROM articles')}
+        missing = sorted(files.keys() - stored)
+        if missing:
+            events.log("Importing {} article metadata files into store.".format(len(missing)), events.INFO)
+        with self.connect() as db:
+            for ref_id in missing:
+                with open(files[ref_id], encoding='utf-8') as fp:
+                    db.execute('INSERT OR IGNORE INTO articles (id, data) VALUES (?, ?)',
+                               (ref_id, json.dumps(json.load(fp), ensure_ascii=False)))
+
+    # ----------------------------------------
+    # import changed, new and deleted patch files of patches directory
+    # - patch files are compared by modification time and size
+    def sync_patches(self, patches_path):
+        files = {}
+        if patches_path and os.path.isdir(patches_path):
+            for entry in os.scandir(patches_path):
+                if entry.is_file() and entry.name.endswith('.json'):
+                    files[os.path.splitext(entry.name)[0]] = entry
+        db = self.connect()
+        stored = {ref_id: (mtime, size) for ref_id, mtime, size in db.execute('SELECT id, mtime, size FROM patches')}
+        for ref_id, entry in files.items():
+            stat = entry.stat()
+            if stored.get(ref_id) != (stat.st_mtime_ns, stat.st_size):
+                with open(entry.path, encoding='utf-8') as fp:
+                    self.put('patches', ref_id, json.load(fp), stat.st_mtime_ns, stat.st_size)
+        for ref_id in stored.keys() - files.keys():
+            self.delete('patches', ref_id)
+
+    # ----------------------------------------
+    # get metadata of all articles with patches applied (in order of article JSON file names)
+    def get_articles(self):
+        articles = []
+        for ref_id, data, patch in self.connect().execute(
+                "SELECT a.id, a.data, p.data FROM articles a LEFT JOIN patches p ON p.id = a.id "
+                "ORDER BY a.id || '.json'"):
+            md_data = json.loads(data)
+            if patch is not None:
+                utils.merge_patch(md_data, json.loads(patch), ref_id)
+            articles.append(md_data)
+        return articles
+
+
+# instantiate store (None if disabled)
+store = Store(os.path.join(params.paths['root'], params.store['path'])) if params.store['enabled'] else None
@@ -0,0 +1,44 @@
+"""
+Test configuration
+ - modules read config.json and the command line (see params.py) on import,
+   so the fixture project is set up before any module is imported
+"""
+
+import os
+import sys
+import json
+import atexit
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+
+# fixture project (outputs are written to temporary directory)
+project = tempfile.mkdtemp(prefix='pdf2xml-')
+atexit.register(shutil.rmtree, project, True)
+paths = {
+    "root": project,
+    "input": {
+        "articles": "input/pdf",
+        "index": "input/index/articles.csv",
+        "front-matter": "input/fm.pdf"
+    },
+    "metadata": {
+        "base": os.path.join(FIXTURES, 'index', 'base.json'),
+        "articles": os.path.join(FIXTURES, 'articles')
+    },
+    "output": {
+        "build": "out/build",
+        "xml": "out/xml",
+        "logs": "out/logs",
+        "patches": "out/patches",
+        "txt": "out/txt"
+    }
+}
+with open(os.path.join(project, 'paths.json'), 'w') as fp:
+    json.dump(paths, fp)
+
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+sys.argv = ['main.py', os.path.join(project, 'paths.json'), '-build', '-datacite', '-quiet']
@@ -0,0 +1,30 @@
+"""
+Native emitters (see emitters.py) produce the same documents as their XSLT templates
+"""
+
+import os
+import glob
+import pytest
+import utils
+from builder import builder
+from emitters import emitters
+from params import params
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ARTICLES = sorted(glob.glob(os.path.join(FIXTURES, 'articles', '*.json')))
+
+
+@pytest.fixture(scope='module')
+def md_base():
+    return utils.load_json(os.path.join(FIXTURES, 'index', 'base.json'))
+
+
+@pytest.mark.parametrize('md_file', ARTICLES, ids=utils.get_id)
+def test_datacite_emitter(md_base, md_file):
+    md_article = utils.load_json(md_file)
+    # base metadata fields attached as in DataCite build (see main.py)
+    for field in ('conference', 'publication', 'publisher'):
+        md_article[field] = md_base[field]
+    native = emitters['datacite']().emit(md_article)
+    xslt = builder.transform(builder.build(md_article), params.paths['templates']['datacite'])
+    assert builder.canonical(native) == builder.canonical(xslt)
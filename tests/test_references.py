@@ -0,0 +1,39 @@
+"""
+Reference list splitting (see Extractor.ref)
+"""
+
+import random
+import pytest
+from extractor import Extractor
+from regex import regex
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return Extractor()
+
+
+# ----------------------------------------
+# random reference section (numbers at line starts, inline numbers and line-wrapped text)
+def _references(rng):
+    lines = []
+    for n in range(1, rng.randint(2, 40)):
+        text = ' '.join(rng.choice(['Smith', 'J.', 'graphics', 'pp.', '2020', 'inter-\nface', 'see', '\n'])
+                        for _ in range(rng.randint(1, 30)))
+        if rng.random() < 0.3:
+            text += ' [{}] '.format(rng.randint(1, 120)) + rng.choice(['cited', 'In', 'Proc.'])
+        lines.append('[{}] {}.'.format(n, text))
+    return '\n'.join(lines)
+
+
+def test_inline_number_kept(extractor):
+    refs = extractor.ref("[1] A. Author. Extends [3] of B.\n[2] C. Author. Title.\n[3] D. Author. Title.")
+    assert refs[0] == {"ref_seq_no": "1", "ref_text": "A. Author. Extends [3]"}
+    assert [r['ref_seq_no'] for r in refs] == ['1', '2', '3']
+
+
+def test_no_marker_in_references(extractor):
+    rng = random.Random(15)
+    for _ in range(2000):
+        for ref in extractor.ref(_references(rng)) or []:
+            assert regex.m1 not in ref['ref_text'] and '%%%' not in ref['ref_text']
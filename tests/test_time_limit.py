@@ -0,0 +1,31 @@
+"""
+Parse time budget (see utils.time_limit)
+"""
+
+import time
+import pytest
+import utils
+
+
+def test_limit_exceeded():
+    with pytest.raises(utils.TimeLimitExceeded):
+        with utils.time_limit(0.01):
+            while True:
+                pass
+
+
+def test_uninterrupted_block_completes():
+    updates = []
+    with pytest.raises(utils.TimeLimitExceeded):
+        with utils.time_limit(0.01):
+            with utils.uninterrupted():
+                time.sleep(0.05)
+                updates.append(1)
+            updates.append(2)
+    assert updates == [1]
+
+
+def test_completed_block_is_not_interrupted():
+    with utils.time_limit(0.01):
+        pass
+    time.sleep(0.05)
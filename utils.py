@@ -9,8 +9,15 @@ Utilities
 import os
 import re
 import json
+import signal
+import hashlib
+import threading
+import unicodedata as ud
+from contextlib import contextmanager
 import lxml.etree as et
 from tqdm import tqdm
+from events import events
+from regex import regex
 
 
 # ----------------------------------------
@@ -40,59 +47,103 @@ def save(xml_data, outfile):
         doctype = docinfo.doctype
     else:
         doctype = '<!DOCTYPE root SYSTEM "proceeding.dtd">'
+        xml_data = et.ElementTree(xml_data)
 
     try:
         with open(outfile, "w", encoding="utf-8") as fp:
-            print("Processing character corrections ... ", end='')
-            content = clean(et.tostring(xml_data,
-                                        encoding='ascii',
-                                        xml_declaration=True,
-                                        pretty_print=True,
-                                        doctype=doctype).decode())
-            print("done.")
-
-            print("Saving XML to file {} ... ".format(outfile), end='')
-            fp.write(content)
-            print("done.")
+            events.log("Saving XML to file {} (with character corrections) ... ".format(outfile), end='')
+            # serialized XML is cleaned up as it is written
+            writer = CleanWriter(fp)
+            # XML declaration (lxml writes the encoding name in upper case)
+            fp.write("<?xml version='1.0' encoding='ascii'?>\n")
+            xml_data.write(writer,
+                           encoding='ascii',
+                           xml_declaration=False,
+                           pretty_print=True,
+                           doctype=doctype)
+            writer.close()
+            events.log("done.")
 
     except Exception as e:
         print("Error: Problem with output file {}:\n{}".format(outfile, e))
 
 
 # ----------------------------------------
-# clean up OCR, special char entities, and various errors/typos
-def clean(content):
+# File wrapper to clean up serialized XML in chunks (see clean())
+class CleanWriter:
+
+    # minimum block size for clean up
+    block_size = 1 << 16
 
-    # Replace double/single quotes NOT in tags with HTML entity
-    regex1a = re.compile(r"(\")(?=[^>]*<)")
-    regex1b = re.compile(r"(\')(?=[^>]*<)")
+    def __init__(self, fp):
+        self.fp = fp
+        # text after last tag opening (cleaned once the next '<' is known)
+        self.pending = ''
 
-    # OCR: Replace LATIN SMALL LIGATURE FI with "fi"
-    regex2 = re.compile(r"(&#64257;)")
+    def write(self, data):
+        self.pending += data.decode('ascii')
+        # clean up in blocks of at least 64 KB
+        if len(self.pending) < self.block_size:
+            return
+        idx = self.pending.rfind('<')
+        if idx > 0:
+            # clean up through the last '<' (quote replacements look ahead to the next '<')
+            self.fp.write(clean(self.pending[:idx + 1])[:-1])
+            self.pending = self.pending[idx:]
+
+    def close(self):
+        self.fp.write(clean(self.pending))
+        self.pending = ''
+
+
+# Replace double/single quotes NOT in tags with HTML entity
+# (next angle bracket is '<')
+re_dq = re.compile(r"(\")(?=[^<>]*<)")
+re_sq = re.compile(r"(\')(?=[^<>]*<)")
+# OCR: Replace LATIN SMALL LIGATURE FI with "fi"
+re_fi = re.compile(r"(&#64257;)")
+# OCR: Replace LATIN SMALL LIGATURE FL with "fl"
+re_fl = re.compile(r"(&#64258;)")
+# special unicode entities
+entities = [
+    ("&#8216;", "&#39;"),
+    ("&#8217;", "&#39;"),
+    ("&#8220;", "&#34;"),
+    ("&#8221;", "&#34;"),
+    ("&#8211;", "-"),
+    ("&#8212;", "-"),
+    ("&#9632;", ""),
+    ("&#8226;", "-"),
+]
 
-    # OCR: Replace LATIN SMALL LIGATURE FL with "fl"
-    regex3 = re.compile(r"(&#64258;)")
+
+# ----------------------------------------
+# clean up OCR, special char entities, and various errors/typos
+def clean(content):
 
     # clean up xml text
-    content = regex1a.sub("&#34;", content)
-    content = regex1b.sub("&#39;", content)
-    content = regex2.sub("fi", content)
-    content = regex3.sub("fl", content)
+    content = re_dq.sub("&#34;", content)
+    content = re_sq.sub("&#39;", content)
+    content = re_fi.sub("fi", content)
+    content = re_fl.sub("fl", content)
 
     # replace special unicode entities
-    content = content.replace("&#8216;", "&#39;")
-    content = content.replace("&#8217;", "&#39;")
-    content = content.replace("&#8220;", "&#34;")
-    content = content.replace("&#8221;", "&#34;")
-    content = content.replace("&#8211;", "-")
-    content = content.replace("&#8212;", "-")
-    content = content.replace("&#9632;", "")
-    content = content.replace("&#8226;", "-")
+    for entity, replacement in entities:
+        content = content.replace(entity, replacement)
 
     return content
 
 
-def collate(md_base_path, md_articles_path, md_patches_path):
+# --------------------------------------
+# Load article metadata files and apply patches (see apply_patch())
+def load_articles(md_articles_path, md_patches_path):
+    return [apply_patch(md_file, md_patches_path)
+            for md_file in tqdm(md_articles_path, desc="Collating Metadata: ", disable=events.quiet)]
+
+
+# --------------------------------------
+# Collate article metadata (see load_articles()) in sessions of base metadata
+def collate(md_base_path, md_articles):
 
     # load metadata
     data = load_json(md_base_path)
@@ -101,9 +152,7 @@ def collate(md_base_path, md_articles_path, md_patches_path):
     assert 'sessions' in data and type(data['sessions']) is list, 'Invalid base metadata.'
 
     # collate article/session metadata in common data node
-    for md_file in tqdm(md_articles_path, desc="Collating Metadata: "):
-        # load article metadata / apply patch fix (if exists)
-        md_article_data = apply_patch(md_file, md_patches_path)
+    for md_article_data in md_articles:
         # get session sequence number
         session_idx = int(md_article_data['session']) - 1
         assert session_idx < n_sessions, 'Invalid session sequence number: {}'.format(session_idx)
@@ -116,6 +165,48 @@ def collate(md_base_path, md_articles_path, md_patches_path):
     return data
 
 
+# character translation table of extracted text clean-up (see clean_text())
+# - LATIN SMALL LIGATURE FI/FL -> "fi"/"fl"
+# - dingbats 2702 - 27B0, 2020 removed
+clean_table = dict.fromkeys(range(0x2702, 0x27b1))
+clean_table.update({0xfb01: 'fi', 0xfb02: 'fl', 0x2020: None})
+
+
+# ----------------------------------------
+# clean up OCR and common miscellaneous errors/typos of extracted text
+def clean_text(content):
+    text = content.lstrip("\r\n\t ")
+    if '"' in text:
+        text = clean_quotes(text)
+    # OCR: Replace LATIN SMALL LIGATURE FI/FL entities with "fi"/"fl"
+    if '&#6425' in text:
+        text = regex.lig_entities.sub(lambda m: "fi" if m.group(1) == '7' else "fl", text)
+    # ASCII text has no ligatures or dingbats and is already in normal form
+    if text.isascii():
+        return text
+    # OCR: Replace ligatures, remove dingbats
+    text = text.translate(clean_table)
+    # handle composing characters
+    # Return the normal ‘NFKC’ form for the Unicode string
+    # The normal form KC (NFKC) first applies the compatibility
+    # decomposition, followed by the canonical composition.
+    return ud.normalize("NFKC", text)
+
+
+# ----------------------------------------
+# Replace double quotes NOT in tags with HTML entity (next angle bracket is '<')
+# (text between quotes is scanned once, from the end of the string)
+def clean_quotes(content):
+    segments = content.split('"')
+    in_text = False
+    for i in range(len(segments) - 1, 0, -1):
+        bracket = regex.angle.search(segments[i])
+        if bracket:
+            in_text = bracket.group() == '<'
+        segments[i] = ("&#34;" if in_text else '"') + segments[i]
+    return ''.join(segments)
+
+
 # --------------------------------------
 # Apply patches to data object
 def apply_patch(md_file, patches_path=None):
@@ -126,11 +217,17 @@ def apply_patch(md_file, patches_path=None):
         file_id = get_id(md_file)
         patch_file = os.path.join(patches_path, file_id + ".json")
         if os.path.isfile(patch_file):
-            print("Using patch for file ID {} ... ".format(file_id))
-            patch = load_json(patch_file)
-            for field in patch.keys():
-                if field in md_data:
-                    md_data[field] = patch[field]
+            merge_patch(md_data, load_json(patch_file), file_id)
+    return md_data
+
+
+# --------------------------------------
+# Replace fields of data object with patched fields (fields not in data are ignored)
+def merge_patch(md_data, patch, file_id):
+    events.log("Using patch for file ID {} ... ".format(file_id))
+    for field in patch.keys():
+        if field in md_data:
+            md_data[field] = patch[field]
     return md_data
 
 
@@ -152,6 +249,84 @@ def get_filesize(file_path):
     return int(os.path.getsize(file_path) / 1000)
 
 
+# --------------------------------------
+# SHA-256 digest of file contents
+def get_digest(file):
+    sha = hashlib.sha256()
+    with open(file, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 16), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+# --------------------------------------
+# Raised when the run time limit of a block is exceeded (see time_limit())
+class TimeLimitExceeded(Exception):
+    pass
+
+
+# --------------------------------------
+# State of running time limit (see time_limit() and uninterrupted())
+class _TimeLimit:
+    # time limit of running block is set (cleared when block completes)
+    active = False
+    # nesting depth of uninterrupted blocks
+    uninterrupted = 0
+    # time limit exceeded within uninterrupted block (raised at its end)
+    expired = False
+
+
+# --------------------------------------
+# Limit run time of block [s] (None: no limit)
+# - uses SIGALRM timer (no limit where unavailable, e.g. Windows or non-main threads)
+# - regex matching checks for signals, so long-running patterns are interrupted
+# - the limit is cleared as soon as the block completes (a late signal is ignored)
+# - updates of shared state in the block are protected by uninterrupted()
+@contextmanager
+def time_limit(seconds):
+    if seconds is None or not hasattr(signal, 'setitimer') \
+            or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    if seconds <= 0:
+        raise TimeLimitExceeded()
+
+    def handler(signum, frame):
+        if not _TimeLimit.active:
+            return
+        if _TimeLimit.uninterrupted:
+            _TimeLimit.expired = True
+            return
+        _TimeLimit.active = False
+        raise TimeLimitExceeded()
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    _TimeLimit.active = True
+    _TimeLimit.expired = False
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        _TimeLimit.active = False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# --------------------------------------
+# Defer time limit (see time_limit()) to end of block
+# - used for updates of state shared across documents (e.g. memoized lookups)
+@contextmanager
+def uninterrupted():
+    _TimeLimit.uninterrupted += 1
+    try:
+        yield
+    finally:
+        _TimeLimit.uninterrupted -= 1
+    if not _TimeLimit.uninterrupted and _TimeLimit.expired and _TimeLimit.active:
+        _TimeLimit.active = False
+        raise TimeLimitExceeded()
+
+
 # --------------------------------------
 # Create subdirectory in path
 def mk_dir(path, *subdir):